@@ -113,6 +113,11 @@ class PropertyAdmin(admin.ModelAdmin):
     filter_horizontal = ('facilities',)  # ✅ THIS ENABLES FACILITY SELECTION UI
     inlines = [PropertyImageInline]
 
+    def save_model(self, request, obj, form, change):
+        if 'region' in form.changed_data and obj.region_id is not None:
+            obj.region_source = ''  # picked by hand: geocoding leaves it alone from now on
+        super().save_model(request, obj, form, change)
+
     fieldsets = (
         ('Basic Info', {
             'fields': ('title', 'description', 'address')
@@ -170,16 +175,48 @@ class MessageAdmin(admin.ModelAdmin):
 
 # core/admin.py
 from django.contrib import admin
-from .models import Notification, UserNotification
+from .models import Notification, UserNotification, OutboundEmail, AccountDeletion, refresh_unread_counters
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'is_active', 'created_at')
-    list_filter = ('is_active',)
+    list_display = ('id', 'title', 'is_active', 'send_to_all', 'target_role', 'fanout_status', 'fanout_count', 'created_at')
+    list_filter = ('is_active', 'send_to_all', 'target_role', 'fanout_status')
     search_fields = ('title', 'message')
+    autocomplete_fields = ('target_regions', 'target_users')
+    readonly_fields = ('fanout_status', 'fanout_count', 'fanned_out_at')
 
 
 @admin.register(UserNotification)
 class UserNotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'notification', 'read', 'read_at')
     list_filter = ('read',)
+
+    # feed rows carry no signals (bulk deletes stay one query); hand edits resync the badge here
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_unread_counters([obj.user_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_unread_counters([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_unread_counters(user_ids)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'username', 'status', 'step', 'rows_deleted', 'files_deleted', 'requested_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('username',)
+    readonly_fields = [f.name for f in AccountDeletion._meta.fields]
@@ -0,0 +1,97 @@
+# core/authentication.py
+"""
+JWT authentication that keeps recently seen users in a per-process LRU.
+
+Entries are keyed by (user_id, jti) and expire after AUTH_USER_CACHE_SECONDS.
+Each entry remembers the user's version from the cache (core/caching.py);
+user saves and deletes bump it (see signals.py), so with a shared CACHES
+backend a deactivated user or changed password is refused by every worker
+on its next request. A cache lookup per request still beats the user
+SELECT; with the per-process default cache other workers only catch up
+when their entry expires, so keep the TTL short there.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import bump_user_versions, get_user_version
+
+
+class UserCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (user_id, jti) -> (expires_at, version, user)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic() or entry[1] != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, version, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, "AUTH_USER_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "AUTH_USER_CACHE_SECONDS", 60),
+)
+
+
+def invalidate_cached_user(*user_ids):
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    # other workers notice the new version on their next lookup
+    bump_user_versions(*user_ids)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Drop-in replacement for JWTAuthentication that skips the user SELECT
+    while the (user, token) pair is cached.
+    """
+
+    def get_user(self, validated_token):
+        if user_cache.ttl <= 0:
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if user_id is None or jti is None:
+            return super().get_user(validated_token)
+
+        key = (str(user_id), jti)
+        # read before the lookup: a bump racing with it leaves a stale version, never a stale user
+        version = get_user_version(user_id)
+        user = user_cache.get(key, version)
+        if user is None:
+            # cold: full lookup including the is_active / revoked-token checks
+            user = super().get_user(validated_token)
+            user_cache.set(key, version, user)
+        # views may mutate request.user; never hand out the shared instance
+        return copy.copy(user)
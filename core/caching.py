@@ -0,0 +1,75 @@
+# core/caching.py
+"""
+Cache keys and invalidation helpers. Invalidation only reaches other
+worker processes when CACHES points at a shared backend (see settings).
+"""
+import time
+
+from django.core.cache import cache
+
+
+def dashboard_cache_key(landlord_id):
+    return f"landlord-dashboard:{landlord_id}"
+
+
+def invalidate_landlord_dashboard(*landlord_ids):
+    keys = [dashboard_cache_key(pk) for pk in landlord_ids if pk is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+# ---------------- version counters ----------------
+# A version changes whenever its data does; readers compare it with the
+# version they built from. Values are fresh timestamps rather than incr()
+# so that a bump works on every backend and after eviction.
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    cache.set(key, time.time_ns(), None)
+
+
+# ---------------- reference data (/api/bootstrap/) ----------------
+BOOTSTRAP_VERSION_KEY = "bootstrap:version"
+
+
+def get_bootstrap_version():
+    return _get_version(BOOTSTRAP_VERSION_KEY)
+
+
+def bump_bootstrap_version():
+    _bump_version(BOOTSTRAP_VERSION_KEY)
+
+
+def bootstrap_cache_key(version, origin):
+    return f"bootstrap:{version}:{origin}"
+
+
+# ---------------- facility registry (core/facilities.py) ----------------
+FACILITY_VERSION_KEY = "facilities:version"
+
+
+def get_facility_version():
+    return _get_version(FACILITY_VERSION_KEY)
+
+
+def bump_facility_version():
+    _bump_version(FACILITY_VERSION_KEY)
+
+
+# ---------------- authenticated users (core/authentication.py) ----------------
+def user_version_key(user_id):
+    return f"auth-user:{user_id}:version"
+
+
+def get_user_version(user_id):
+    return _get_version(user_version_key(user_id))
+
+
+def bump_user_versions(*user_ids):
+    cache.set_many({user_version_key(pk): time.time_ns() for pk in user_ids}, None)
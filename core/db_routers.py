@@ -0,0 +1,197 @@
+# core/db_routers.py
+"""
+Read-replica routing.
+
+Replicas are configured from DATABASE_REPLICAS (see settings) as database
+aliases "replica1", "replica2", ... ReplicaRoutingMiddleware sends the
+reads of a request to a replica only when:
+
+- the request is a GET/HEAD/OPTIONS,
+- the view opted in (`use_read_replica = True`, or the decorator below for
+  function views), and
+- the same client has not written in the last REPLICA_STICKY_SECONDS, so
+  it reads its own writes. A successful write sets a short-lived cookie
+  (REPLICA_STICKY_COOKIE), which every worker sees and which survives
+  token refreshes; for clients that drop cookies the write is also
+  recorded in the cache under the user id (taken from the access token).
+  That half needs a shared cache, hence the system check below.
+
+Writes always go to "default". A replica that fails its health check is
+skipped for REPLICA_HEALTH_CHECK_SECONDS; with none healthy, reads fall
+back to "default".
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+_read_from_replica = contextvars.ContextVar("read_from_replica", default=False)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+
+def use_read_replica(view_func):
+    """
+    Opt a function view into replica reads (class views set `use_read_replica = True`).
+    """
+    view_func.use_read_replica = True
+    return view_func
+
+
+# ---------------- health ----------------
+_health = {}  # alias -> (healthy, checked_at)
+_health_lock = threading.Lock()
+
+
+def _check(alias):
+    try:
+        conn = connections[alias]
+        with conn.cursor() as cursor:
+            if conn.vendor == "postgresql":
+                # on a standby, how far replay is behind; NULL on a primary
+                cursor.execute("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")
+                lag = cursor.fetchone()[0]
+                max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 30)
+                if lag is not None and lag > max_lag:
+                    logger.warning("replica %s is %.0fs behind; not using it", alias, lag)
+                    return False
+            else:
+                cursor.execute("SELECT 1")
+        return True
+    except Exception:
+        logger.warning("replica %s failed its health check", alias, exc_info=True)
+        return False
+
+
+def replica_is_healthy(alias):
+    ttl = getattr(settings, "REPLICA_HEALTH_CHECK_SECONDS", 10)
+    now = time.monotonic()
+    healthy, checked_at = _health.get(alias, (None, 0))
+    if healthy is None or now - checked_at > ttl:
+        healthy = _check(alias)
+        with _health_lock:
+            _health[alias] = (healthy, now)
+    return healthy
+
+
+def pick_replica():
+    candidates = [alias for alias in replica_aliases() if replica_is_healthy(alias)]
+    return random.choice(candidates) if candidates else None
+
+
+# ---------------- stickiness ----------------
+def _sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def _cookie_name():
+    return getattr(settings, "REPLICA_STICKY_COOKIE", "db_primary_until")
+
+
+def _token_user_id(request):
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from rest_framework_simplejwt.settings import api_settings
+
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw = auth.get_raw_token(header) if header else None
+    if raw is None:
+        return None
+    try:
+        return auth.get_validated_token(raw).get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def _client_key(request):
+    # the user id outlives any one access token; no query needed to read it
+    user_id = _token_user_id(request)
+    if user_id is not None:
+        return f"db-sticky:user:{user_id}"
+    ident = request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.META.get("REMOTE_ADDR", "")
+    return "db-sticky:" + hashlib.sha1(ident.encode()).hexdigest()
+
+
+def mark_recent_write(request, response):
+    seconds = _sticky_seconds()
+    response.set_cookie(
+        _cookie_name(), str(int(time.time()) + seconds), max_age=seconds,
+        httponly=True, samesite="Lax", secure=settings.SESSION_COOKIE_SECURE,
+    )
+    cache.set(_client_key(request), 1, seconds)
+
+
+def wrote_recently(request):
+    try:
+        if int(request.COOKIES.get(_cookie_name(), 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    return cache.get(_client_key(request)) is not None
+
+
+@checks.register(checks.Tags.caches)
+def check_sticky_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if replica_aliases() and backend.rsplit(".", 1)[-1] in ("LocMemCache", "DummyCache"):
+        return [checks.Warning(
+            "Read replicas are configured but the default cache is per process.",
+            hint="Clients that do not keep cookies may not read their own writes; point CACHES at a shared backend.",
+            id="core.W001",
+        )]
+    return []
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_from_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_aliases():
+            mark_recent_write(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not replica_aliases():
+            return None
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        opted_in = getattr(view_func, "use_read_replica", False) or getattr(view_class, "use_read_replica", False)
+        if opted_in and not wrote_recently(request):
+            _read_from_replica.set(True)
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get():
+            return pick_replica() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
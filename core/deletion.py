@@ -0,0 +1,145 @@
+# core/deletion.py
+"""
+Account deletion in the background.
+
+`request_account_deletion()` deactivates the user at once and schedules
+`delete_account()`, which removes the user's rows table by table in
+batches of plain `DELETE ... WHERE id IN (...)` statements (no cascade
+collector, no per-row signals), deletes the media files of every removed
+row after its batch commits, and records progress on AccountDeletion.
+A run interrupted by a restart is resumed by `process_account_deletions`.
+"""
+import logging
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .caching import invalidate_landlord_dashboard
+from .models import (
+    AccountDeletion,
+    Application,
+    Conversation,
+    Message,
+    Notification,
+    PasswordResetOTP,
+    Property,
+    PropertyImage,
+    UnreadCounter,
+    User,
+    UserNotification,
+    refresh_unread_counters,
+)
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+
+def request_account_deletion(user):
+    """
+    Deactivate `user` now and delete their data after commit.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        deletion, _ = AccountDeletion.objects.get_or_create(user_id=user.pk, defaults={"username": user.username})
+        run_in_background(delete_account, deletion.pk)
+    return deletion
+
+
+def _raw_delete(model, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({placeholders})", ids)
+        return cursor.rowcount
+
+
+def _delete_files(storage, names):
+    deleted = 0
+    for name in names:
+        try:
+            storage.delete(name)
+            deleted += 1
+        except Exception:
+            logger.warning("could not delete media file %s", name, exc_info=True)
+    return deleted
+
+
+def _purge(deletion, step, qs, batch_size, files=()):
+    """
+    Delete every row of `qs` in batches. `files` names FileFields whose
+    files are removed once the batch that deleted their rows commits.
+    """
+    AccountDeletion.objects.filter(pk=deletion.pk).update(step=step)
+    model = qs.model
+    while True:
+        with transaction.atomic():
+            rows = list(qs.order_by().values_list("pk", *files)[:batch_size])
+            if not rows:
+                return
+            deleted = _raw_delete(model, [row[0] for row in rows])
+            AccountDeletion.objects.filter(pk=deletion.pk).update(rows_deleted=F("rows_deleted") + deleted)
+        for i, field in enumerate(files, start=1):
+            storage = model._meta.get_field(field).storage
+            names = [row[i] for row in rows if row[i]]
+            if names:
+                removed = _delete_files(storage, names)
+                AccountDeletion.objects.filter(pk=deletion.pk).update(files_deleted=F("files_deleted") + removed)
+
+
+def delete_account(deletion_id, batch_size=500):
+    """
+    Carry out an AccountDeletion. Every step only deletes what is still
+    there, so re-running after a failure picks up where it stopped.
+    """
+    deletion = AccountDeletion.objects.get(pk=deletion_id)
+    if deletion.status == "done":
+        return deletion
+    uid = deletion.user_id
+    resumed = deletion.status != "pending"
+    AccountDeletion.objects.filter(pk=deletion_id).update(status="running", started_at=timezone.now(), last_error="")
+
+    # whose derived state changes once these rows are gone
+    peer_ids = set(Message.objects.filter(sender_id=uid, read_at__isnull=True).values_list("receiver_id", flat=True))
+    landlord_ids = set(
+        Application.objects.filter(renter_id=uid).values_list("property__landlord_id", flat=True)
+    )
+
+    steps = [
+        # conversations first: they hold the only references to the messages
+        ("conversations", Conversation.objects.filter(Q(owner_id=uid) | Q(peer_id=uid)), ()),
+        ("messages", Message.objects.filter(Q(sender_id=uid) | Q(receiver_id=uid)), ()),
+        ("applications", Application.objects.filter(Q(renter_id=uid) | Q(property__landlord_id=uid)), ()),
+        ("property images", PropertyImage.objects.filter(property__landlord_id=uid), ("image", "thumbnail")),
+        ("property facilities", Property.facilities.through.objects.filter(property__landlord_id=uid), ()),
+        ("properties", Property.objects.filter(landlord_id=uid), ()),
+        ("notifications", UserNotification.objects.filter(user_id=uid), ()),
+        ("notification targets", Notification.target_users.through.objects.filter(user_id=uid), ()),
+        ("password reset codes", PasswordResetOTP.objects.filter(user_id=uid), ()),
+        ("unread counter", UnreadCounter.objects.filter(user_id=uid), ()),
+    ]
+    try:
+        for step, qs, files in steps:
+            _purge(deletion, step, qs, batch_size, files)
+
+        AccountDeletion.objects.filter(pk=deletion_id).update(step="user")
+        user = User.objects.filter(pk=uid).first()
+        if user is not None:
+            avatar = user.avatar.name if user.avatar else None
+            # only small leftovers remain (tokens, groups, admin log), so the collector is cheap
+            user.delete()
+            if avatar:
+                removed = _delete_files(User._meta.get_field("avatar").storage, [avatar])
+                AccountDeletion.objects.filter(pk=deletion_id).update(files_deleted=F("files_deleted") + removed)
+    except Exception as exc:
+        AccountDeletion.objects.filter(pk=deletion_id).update(status="failed", last_error=str(exc)[:1000])
+        raise
+
+    # a resumed run cannot tell which peers' messages an earlier run removed
+    refresh_unread_counters(None if resumed else peer_ids)
+    invalidate_landlord_dashboard(uid, *landlord_ids)
+    AccountDeletion.objects.filter(pk=deletion_id).update(status="done", step="", finished_at=timezone.now())
+    deletion.refresh_from_db()
+    return deletion
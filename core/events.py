@@ -0,0 +1,259 @@
+# core/events.py
+"""
+Server-push of new messages, applications and notifications as
+Server-Sent Events on the ASGI app (see rental_project/asgi.py).
+
+Signal handlers call `publish_event()` after commit. Delivery goes to
+the subscribers of this process directly, or, when EVENTS_SOCKET_DIR is
+set, as a datagram to every worker's Unix socket in that directory so
+each worker fans the event out to its own connections.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# users per datagram when publishing to an explicit recipient list
+PUBLISH_CHUNK = 500
+QUEUE_SIZE = 100
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # slow client: drop rather than grow without bound
+        pass
+
+
+class EventBroker:
+    def __init__(self, socket_dir=None):
+        self.socket_dir = socket_dir
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> {queue: loop}
+        self._listening = set()  # loops with a socket reader attached
+        self._recv_sock = None
+        self._send_sock = None
+
+    # ---------------- subscribing (event loop side) ----------------
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, {})[queue] = loop
+        if self.socket_dir and loop not in self._listening:
+            self._listen(loop)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.pop(queue, None)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(q) for q in self._subscribers.values())
+
+    def _listen(self, loop):
+        if self._recv_sock is None:
+            os.makedirs(self.socket_dir, exist_ok=True)
+            path = os.path.join(self.socket_dir, f"worker-{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.unlink(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            sock.setblocking(False)
+            atexit.register(os.unlink, path)
+            self._recv_sock = sock
+        loop.add_reader(self._recv_sock.fileno(), self._on_datagram)
+        self._listening.add(loop)
+
+    def _on_datagram(self):
+        while True:
+            try:
+                data = self._recv_sock.recv(65536)
+            except BlockingIOError:
+                return
+            try:
+                payload = json.loads(data)
+            except ValueError:
+                continue
+            self.deliver(payload.get("users"), payload["event"])
+
+    # ---------------- publishing (any thread) ----------------
+    def deliver(self, user_ids, event):
+        """
+        Hand `event` to this process's subscribers; `user_ids=None` means all.
+        """
+        with self._lock:
+            if user_ids is None:
+                targets = [item for queues in self._subscribers.values() for item in queues.items()]
+            else:
+                targets = [item for uid in user_ids for item in self._subscribers.get(uid, {}).items()]
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+    def publish(self, user_ids, event):
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            if not user_ids:
+                return
+        if not self.socket_dir:
+            self.deliver(user_ids, event)
+            return
+        chunks = [None] if user_ids is None else [user_ids[i:i + PUBLISH_CHUNK] for i in range(0, len(user_ids), PUBLISH_CHUNK)]
+        for chunk in chunks:
+            self._broadcast(json.dumps({"users": chunk, "event": event}, default=str).encode())
+
+    def _broadcast(self, data):
+        try:
+            entries = list(os.scandir(self.socket_dir))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._send_sock is None:
+                self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._send_sock.setblocking(False)
+            sock = self._send_sock
+            for entry in entries:
+                if not entry.name.endswith(".sock"):
+                    continue
+                try:
+                    sock.sendto(data, entry.path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # worker is gone; clean up its socket
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+                except BlockingIOError:
+                    logger.warning("event socket %s is full; dropping event", entry.path)
+
+
+broker = EventBroker(getattr(settings, "EVENTS_SOCKET_DIR", "") or None)
+
+
+def publish_event(user_ids, event_type, **data):
+    """
+    Publish an event to the given users (None = everyone connected).
+    Call after commit so clients never fetch rows that are not visible yet.
+    """
+    try:
+        broker.publish(user_ids, {"type": event_type, **data})
+    except Exception:
+        logger.exception("failed to publish %s event", event_type)
+
+
+# =========================
+# SSE ENDPOINT (ASGI)
+# =========================
+def _authenticate(raw_token):
+    """
+    (user pk, token expiry as a unix time) for a valid access token, else None.
+    """
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+    from django.contrib.auth import get_user_model
+
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    User = get_user_model()
+    # the claim may be a string; subscribers are keyed by the integer pk
+    pk = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id, "is_active": True}).values_list("pk", flat=True).first()
+    return None if pk is None else (pk, token.get("exp"))
+
+
+def _token_from_scope(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.decode("latin1").split()
+            if len(parts) == 2 and parts[0] in settings.SIMPLE_JWT.get("AUTH_HEADER_TYPES", ("Bearer",)):
+                return parts[1]
+    # EventSource cannot set headers, so also accept ?token=
+    query = parse_qs(scope.get("query_string", b"").decode("latin1"))
+    return (query.get("token") or [None])[0]
+
+
+async def _respond(send, status, body):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+
+async def stream_events(user_id, receive, send, heartbeat=None, expires_at=None):
+    """
+    Stream events for `user_id` until the client disconnects or, when given,
+    the unix time `expires_at` (the token's exp) passes. An expired stream
+    ends with an `expired` event: reconnect with a fresh token.
+    """
+    heartbeat = heartbeat or getattr(settings, "EVENTS_HEARTBEAT_SECONDS", 25)
+    queue = broker.subscribe(user_id)
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+        while True:
+            timeout = heartbeat
+            if expires_at is not None:
+                timeout = min(heartbeat, expires_at - time.time())
+                if timeout <= 0:
+                    await send({"type": "http.response.body", "body": b"event: expired\ndata: {}\n\n"})
+                    break
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                if disconnected.result().get("type") == "http.disconnect":
+                    getter.cancel()
+                    break
+                disconnected = asyncio.ensure_future(receive())
+                if getter not in done:
+                    getter.cancel()
+                    continue
+            if getter in done:
+                event = getter.result()
+                chunk = f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+            else:
+                getter.cancel()
+                if expires_at is not None and time.time() >= expires_at:
+                    continue  # the top of the loop ends the stream
+                chunk = ": ping\n\n"
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(user_id, queue)
+
+
+async def sse_app(scope, receive, send):
+    raw_token = _token_from_scope(scope)
+    auth = await sync_to_async(_authenticate)(raw_token) if raw_token else None
+    if auth is None:
+        await _respond(send, 401, {"detail": "Authentication credentials were not provided or are invalid."})
+        return
+    user_id, expires_at = auth
+    await stream_events(user_id, receive, send, expires_at=expires_at)
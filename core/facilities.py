@@ -0,0 +1,149 @@
+# core/facilities.py
+"""
+Process-wide registry of facilities, so turning client input ("wifi",
+"Wi-Fi", 3, "[1, 2]", "gym,pool") into Facility ids costs no queries.
+
+The registry is rebuilt (one query) when the version stored under
+FACILITY_VERSION_KEY in the cache changes; Facility saves and deletes bump
+it (signals.py). That only reaches other workers with a shared cache, so a
+registry is also rebuilt once it is FACILITY_REGISTRY_TTL seconds old, and
+input that matches nothing triggers a reload (at most once a second) before
+it is rejected: a facility added in another process resolves at once,
+renames and deletions show within the TTL.
+"""
+import json
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from rest_framework import serializers
+
+from .caching import get_facility_version
+
+# extra spellings clients send, by facility key
+ALIASES = {
+    "ac": "air_conditioning",
+    "aircon": "air_conditioning",
+    "wireless": "wifi",
+    "carparking": "parking",
+    "pets": "pets_allowed",
+}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(value):
+    """'Wi-Fi' -> 'wifi', 'free_parking' / 'Free Parking' -> 'freeparking'."""
+    return _NON_ALNUM.sub("", str(value).lower())
+
+
+def parse_facility_input(raw):
+    """
+    Split client input into tokens: ints for ids, stripped strings otherwise.
+    Accepts a list, a JSON array string, a comma-separated string or a scalar.
+    """
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if raw.startswith("["):
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                raw = raw.strip("[]").split(",")
+        else:
+            raw = raw.split(",")
+    if not isinstance(raw, (list, tuple)):
+        raw = [raw]
+    tokens = []
+    for item in raw:
+        if item is None or isinstance(item, bool):
+            continue
+        if isinstance(item, int):
+            tokens.append(item)
+            continue
+        s = str(item).strip().strip('"\'')
+        if s:
+            tokens.append(int(s) if s.isdigit() else s)
+    return tokens
+
+
+class FacilityRegistry:
+    def __init__(self, facilities, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.facilities = sorted(facilities, key=lambda f: f.name)
+        self.by_id = {f.id: f for f in self.facilities}
+        self.by_key = {f.key: f for f in self.facilities}
+        self.by_name = {}
+        for f in self.facilities:
+            self.by_name.setdefault(normalize(f.name), f)
+        for f in self.facilities:
+            # a key wins over another facility's name
+            self.by_name[normalize(f.key)] = f
+        for alias, key in ALIASES.items():
+            if key in self.by_key:
+                self.by_name.setdefault(normalize(alias), self.by_key[key])
+
+    def get(self, token):
+        if isinstance(token, int):
+            return self.by_id.get(token)
+        return self.by_key.get(token) or self.by_name.get(normalize(token))
+
+    def resolve(self, raw):
+        """
+        Return (ids, unknown): ids in input order without duplicates, and the
+        tokens that matched nothing.
+        """
+        ids, unknown, seen = [], [], set()
+        for token in parse_facility_input(raw):
+            facility = self.get(token)
+            if facility is None:
+                unknown.append(token)
+            elif facility.id not in seen:
+                seen.add(facility.id)
+                ids.append(facility.id)
+        return ids, unknown
+
+
+_registry = None
+_lock = threading.Lock()
+
+MISS_RELOAD_SECONDS = 1.0
+
+
+def _is_stale(registry, version):
+    # no version means no usable cache (e.g. DummyCache): always rebuild
+    if registry is None or version is None or registry.version != version:
+        return True
+    return time.monotonic() - registry.loaded_at > getattr(settings, "FACILITY_REGISTRY_TTL", 30)
+
+
+def get_registry(reload=False):
+    global _registry
+    version = get_facility_version()
+    registry = _registry
+    if reload or _is_stale(registry, version):
+        from .models import Facility
+
+        with _lock:
+            if _registry is registry or _is_stale(_registry, version):
+                _registry = FacilityRegistry(list(Facility.objects.all()), version)
+            registry = _registry
+    return registry
+
+
+def resolve_facilities(raw):
+    """
+    Facility ids for client input; raises ValidationError naming unknown entries.
+    """
+    registry = get_registry()
+    ids, unknown = registry.resolve(raw)
+    if unknown and time.monotonic() - registry.loaded_at > MISS_RELOAD_SECONDS:
+        # perhaps added in another worker since this registry was built
+        ids, unknown = get_registry(reload=True).resolve(raw)
+    if unknown:
+        raise serializers.ValidationError(f"Unknown facilities: {', '.join(map(str, unknown))}")
+    return ids
@@ -0,0 +1,261 @@
+# core/geo.py
+"""
+Reverse geocoding of lat/lng to Region/District from boundary polygons in
+a local GeoJSON file (GEO_BOUNDARIES_PATH).
+
+Features carry the region name in GEO_REGION_PROPERTY and, for district
+polygons, the district name in GEO_DISTRICT_PROPERTY. Candidates for a
+point come from a grid of buckets over the features' bounding boxes; the
+point-in-polygon test (even-odd rule over all rings, so holes and
+multipolygons need no special casing) only walks the edges stored in the
+horizontal band that contains the point.
+
+Without a boundaries file, TownGeocoder answers from the bundled
+GEO_TOWNS_PATH instead: the region of the nearest district town on the
+same land area (mainland, Unguja, Pemba, Mafia). That is right near
+towns and rough near region borders, and it never names a district.
+Properties record which of the two placed them (Property.region_source),
+so a town guess is re-resolved once boundaries are configured.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Shape:
+    __slots__ = ("props", "bbox", "ymin", "band_height", "bands")
+
+    def __init__(self, props, rings, max_bands):
+        self.props = props
+        edges = []
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                if y1 != y2:  # horizontal edges never cross a horizontal ray
+                    edges.append((x1, y1, x2, y2))
+        xs = [p[0] for ring in rings for p in ring]
+        ys = [p[1] for ring in rings for p in ring]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.ymin = self.bbox[1]
+        count = max(1, min(max_bands, len(edges) // 8))
+        self.band_height = ((self.bbox[3] - self.bbox[1]) / count) or 1.0
+        self.bands = [[] for _ in range(count)]
+        for edge in edges:
+            lo, hi = sorted((edge[1], edge[3]))
+            for b in range(self._band(lo), self._band(hi) + 1):
+                self.bands[b].append(edge)
+
+    def _band(self, y):
+        return min(len(self.bands) - 1, max(0, int((y - self.ymin) / self.band_height)))
+
+    def contains(self, x, y):
+        minx, miny, maxx, maxy = self.bbox
+        if not (minx <= x <= maxx and miny <= y <= maxy):
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self.bands[self._band(y)]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+class PolygonIndex:
+    """
+    Point-in-polygon lookup over many shapes, bucketed on a regular grid.
+    """
+
+    def __init__(self, cell_size=0.25, max_bands=256):
+        self.cell_size = cell_size
+        self.max_bands = max_bands
+        self.shapes = []
+        self.cells = {}
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, props, geometry):
+        """
+        Add a GeoJSON Polygon or MultiPolygon geometry ([lng, lat] positions).
+        """
+        if geometry["type"] == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            return
+        rings = [[(float(p[0]), float(p[1])) for p in ring] for polygon in polygons for ring in polygon if len(ring) >= 3]
+        if not rings:
+            return
+        shape = _Shape(props, rings, self.max_bands)
+        index = len(self.shapes)
+        self.shapes.append(shape)
+        (cx1, cy1), (cx2, cy2) = self._cell(*shape.bbox[:2]), self._cell(*shape.bbox[2:])
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.cells.setdefault((cx, cy), []).append(index)
+
+    def lookup(self, lat, lng):
+        """
+        Properties of the first shape containing the point, or None.
+        """
+        for index in self.cells.get(self._cell(lng, lat), ()):
+            shape = self.shapes[index]
+            if shape.contains(lng, lat):
+                return shape.props
+        return None
+
+
+class Geocoder:
+    MISS_RELOAD_SECONDS = 60
+    SOURCE = "boundaries"  # Property.region_source of the regions it fills in
+
+    def __init__(self, features, region_key="region", district_key="district", cell_size=0.25):
+        self.regions = PolygonIndex(cell_size)
+        self.districts = PolygonIndex(cell_size)
+        for feature in features:
+            props = feature.get("properties") or {}
+            region = (props.get(region_key) or "").strip()
+            if not region or not feature.get("geometry"):
+                continue
+            district = (props.get(district_key) or "").strip()
+            target = self.districts if district else self.regions
+            target.add((region, district or None), feature["geometry"])
+        self._ids = None
+        self._loaded_at = 0.0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("features", []), **kwargs)
+
+    def names(self, lat, lng):
+        """
+        (region_name, district_name) for the point; either may be None.
+        """
+        if lat is None or lng is None:
+            return None, None
+        hit = self.districts.lookup(lat, lng) or self.regions.lookup(lat, lng)
+        return hit if hit else (None, None)
+
+    def replaces(self, region_source):
+        """
+        Whether this geocoder's answer should override a region filled in by `region_source`.
+        """
+        return region_source == "towns"
+
+    def _load_ids(self):
+        from .models import District, Region
+
+        regions = {name.lower(): pk for pk, name in Region.objects.values_list("id", "name")}
+        districts = {
+            (region_id, name.lower()): pk for pk, region_id, name in District.objects.values_list("id", "region_id", "name")
+        }
+        self._ids = (regions, districts)
+        self._loaded_at = time.monotonic()
+
+    def forget_ids(self):
+        self._ids = None
+
+    def resolve(self, lat, lng):
+        """
+        (region_id, district_id) for the point, matched to rows by name.
+        """
+        region_name, district_name = self.names(lat, lng)
+        if region_name is None:
+            return None, None
+        if self._ids is None or (
+            region_name.lower() not in self._ids[0] and time.monotonic() - self._loaded_at >= self.MISS_RELOAD_SECONDS
+        ):
+            # first use, or regions were imported since: reload the name maps, but
+            # not on every lookup of a name that has no row
+            self._load_ids()
+        regions, districts = self._ids
+        region_id = regions.get(region_name.lower())
+        district_id = districts.get((region_id, district_name.lower())) if district_name and region_id else None
+        return region_id, district_id
+
+
+class TownGeocoder(Geocoder):
+    """
+    Region of the nearest town within the land area (outline) holding the point.
+    """
+    SOURCE = "towns"
+
+    def __init__(self, areas, cell_size=0.25):
+        super().__init__([], cell_size=cell_size)
+        self.areas = PolygonIndex(cell_size)
+        for area in areas:
+            towns = [(region, float(lat), float(lng)) for _name, region, lat, lng in area["towns"]]
+            if towns:
+                self.areas.add(towns, {"type": "Polygon", "coordinates": [area["outline"]]})
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["areas"], **kwargs)
+
+    def names(self, lat, lng):
+        if lat is None or lng is None:
+            return None, None
+        towns = self.areas.lookup(lat, lng)
+        if towns is None:
+            return None, None
+        scale = math.cos(math.radians(lat)) ** 2  # a degree of longitude shrinks away from the equator
+        region = min(towns, key=lambda t: (t[1] - lat) ** 2 + (t[2] - lng) ** 2 * scale)[0]
+        return region, None
+
+    def replaces(self, region_source):
+        return False
+
+
+_geocoder = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_geocoder():
+    """
+    The process-wide Geocoder: boundary polygons when GEO_BOUNDARIES_PATH
+    exists, else the bundled towns; None when neither is there.
+    """
+    global _geocoder, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                path = getattr(settings, "GEO_BOUNDARIES_PATH", "")
+                towns = getattr(settings, "GEO_TOWNS_PATH", "")
+                if path and os.path.exists(path):
+                    _geocoder = Geocoder.from_file(
+                        path,
+                        region_key=getattr(settings, "GEO_REGION_PROPERTY", "region"),
+                        district_key=getattr(settings, "GEO_DISTRICT_PROPERTY", "district"),
+                    )
+                elif towns and os.path.exists(towns):
+                    logger.info("no boundaries at %s; geocoding regions from the towns in %s", path, towns)
+                    _geocoder = TownGeocoder.from_file(towns)
+                else:
+                    logger.info("no boundaries at %s; reverse geocoding is off", path)
+                _loaded = True
+    return _geocoder
+
+
+def forget_region_ids():
+    """
+    Make the process-wide geocoder re-read Region/District ids on next use.
+    """
+    if _geocoder is not None:
+        _geocoder.forget_ids()
+
+
+def reverse_geocode(lat, lng):
+    geocoder = get_geocoder()
+    if geocoder is None:
+        return None, None
+    return geocoder.resolve(lat, lng)
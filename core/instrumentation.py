@@ -0,0 +1,180 @@
+# core/instrumentation.py
+"""
+Per-request timings and query budgets.
+
+RequestMetricsMiddleware counts the queries of a request on every database
+alias and adds up their time, along with the spans recorded by `timed()`
+(serializers, image processing). The totals go out in a Server-Timing
+header and as one log line on the "core.requests" logger.
+
+A view sets `query_budget = N`, or {"GET": N, ...} to budget only some
+methods (function views: `@query_budget(...)` above `@api_view`). Going
+over it logs a warning, and raises QueryBudgetExceeded when
+QUERY_BUDGET_RAISE is on (as it is for the test suite).
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("core.requests")
+
+_metrics = contextvars.ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    __slots__ = ("view", "queries", "db_ms", "spans", "depth")
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_ms = 0.0
+        self.spans = {}  # name -> ms
+        self.depth = {}  # name -> open spans, so nested ones are not counted twice
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - start) * 1000
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and the `extra` fields.
+    """
+    _reserved = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update((k, v) for k, v in vars(record).items() if k not in self._reserved)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def current_metrics():
+    return _metrics.get()
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to span `name` of the current request;
+    a no-op outside one. Also usable as a decorator.
+    """
+    metrics = _metrics.get()
+    if metrics is None or metrics.depth.get(name):
+        yield
+        return
+    metrics.depth[name] = 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth[name] = 0
+        metrics.spans[name] = metrics.spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+class TimedSerializerMixin:
+    """
+    Times representation and validation as the "serialize" span. Nested
+    and many=True serializers are counted once.
+    """
+
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
+    def is_valid(self, *args, **kwargs):
+        with timed("serialize"):
+            return super().is_valid(*args, **kwargs)
+
+
+def query_budget(limit):
+    """
+    Set the query budget of a function view; apply it above @api_view.
+    """
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+def _view_budget(view_func, method):
+    budget = getattr(view_func, "query_budget", None)
+    if budget is None:
+        view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+        budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    return budget
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        request._query_budget = None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                # responses come back rendered, so this covers renderers too
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        if getattr(settings, "SERVER_TIMING", True):
+            entries = [f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"']
+            entries += [f"{name};dur={ms:.1f}" for name, ms in metrics.spans.items()]
+            entries.append(f"total;dur={total_ms:.1f}")
+            response["Server-Timing"] = ", ".join(entries)
+
+        view = getattr(request.resolver_match, "view_name", None) or request.path
+        logger.info(
+            "%s %s %s %.1fms queries=%d db=%.1fms %s",
+            request.method, view, response.status_code, total_ms, metrics.queries, metrics.db_ms,
+            " ".join(f"{name}={ms:.1f}ms" for name, ms in metrics.spans.items()),
+            extra={
+                "method": request.method, "view": view, "status": response.status_code,
+                "duration_ms": round(total_ms, 1), "queries": metrics.queries,
+                "db_ms": round(metrics.db_ms, 1), "spans": {k: round(v, 1) for k, v in metrics.spans.items()},
+            },
+        )
+
+        budget = request._query_budget
+        if budget is not None and metrics.queries > budget:
+            message = f"{request.method} {view} ran {metrics.queries} queries; its budget is {budget}"
+            if getattr(settings, "QUERY_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={"view": view, "queries": metrics.queries, "budget": budget})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = _view_budget(view_func, request.method)
+        metrics = _metrics.get()
+        if metrics is not None:
+            metrics.view = request.resolver_match.view_name
+        return None
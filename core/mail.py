@@ -0,0 +1,169 @@
+# core/mail.py
+"""
+Durable outbound email queue.
+
+Requests call `queue_mail()`, which only inserts an OutboundEmail row.
+`send_queued_mail()` drains due rows over a single backend connection;
+it is run by the `send_queued_email` worker command and, best effort,
+right after a mail is queued (EMAIL_QUEUE_KICK). A sent row keeps its
+subject and recipients but not its body; `send_queued_email --purge`
+deletes sent and failed rows after EMAIL_QUEUE_KEEP_DAYS.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# only one in-process drain at a time; the worker command is not limited by this
+_kick_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def queue_mail(subject, message, recipient_list, from_email=None):
+    """
+    Queue a plain-text email. Call inside the transaction that produced it:
+    if that rolls back, nothing is sent.
+    """
+    email = OutboundEmail.objects.create(
+        subject=subject, body=message, from_email=from_email or "", to=list(recipient_list),
+    )
+    if _setting("EMAIL_QUEUE_KICK", True):
+        run_in_background(_kick)
+    return email
+
+
+def _kick():
+    if not _kick_lock.acquire(blocking=False):
+        return  # a drain is already running in this process and will pick the row up
+    try:
+        while send_queued_mail()["claimed"]:
+            pass
+    finally:
+        _kick_lock.release()
+
+
+def retry_delay(attempts):
+    base = _setting("EMAIL_QUEUE_RETRY_BASE_SECONDS", 30)
+    return min(base * 2 ** (attempts - 1), _setting("EMAIL_QUEUE_RETRY_MAX_SECONDS", 3600))
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to `batch_size` due rows as sending and return them. Rows left
+    in `sending` by a crashed worker are due again once their lease expires.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=_setting("EMAIL_QUEUE_LEASE_SECONDS", 300))
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.filter(status__in=("queued", "sending"), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        OutboundEmail.objects.filter(id__in=ids).update(status="sending", next_attempt_at=lease)
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by("id"))
+
+
+def send_queued_mail(batch_size=None, max_attempts=None, connection=None):
+    """
+    Send one batch of due emails over one connection and return metrics:
+    claimed, sent, retried, failed, seconds.
+    """
+    batch_size = batch_size or _setting("EMAIL_QUEUE_BATCH_SIZE", 100)
+    max_attempts = max_attempts or _setting("EMAIL_QUEUE_MAX_ATTEMPTS", 5)
+    stats = {"claimed": 0, "sent": 0, "retried": 0, "failed": 0, "seconds": 0.0}
+    batch = claim_batch(batch_size)
+    if not batch:
+        return stats
+    stats["claimed"] = len(batch)
+    start = time.perf_counter()
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # could not even connect: every claimed row counts as a failed attempt
+        logger.warning("email backend unavailable: %s", exc)
+        for email in batch:
+            _record_failure(email, exc, max_attempts, stats)
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+    try:
+        for email in batch:
+            message = EmailMessage(
+                subject=email.subject, body=email.body, from_email=email.from_email or None,
+                to=email.to, connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                _record_failure(email, exc, max_attempts, stats)
+                # the server may have dropped us; start the next message on a fresh connection
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+                continue
+            # bodies can hold password reset codes: keep nothing readable once delivered
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status="sent", attempts=email.attempts + 1, sent_at=timezone.now(), last_error="", body="",
+            )
+            stats["sent"] += 1
+    finally:
+        connection.close()
+    stats["seconds"] = time.perf_counter() - start
+    logger.info(
+        "email queue: sent=%(sent)d retried=%(retried)d failed=%(failed)d in %(seconds).2fs", stats,
+    )
+    return stats
+
+
+def _record_failure(email, exc, max_attempts, stats):
+    attempts = email.attempts + 1
+    if attempts >= max_attempts:
+        status, due = "failed", timezone.now()
+        stats["failed"] += 1
+        logger.error("email %s failed permanently after %d attempts: %s", email.pk, attempts, exc)
+    else:
+        status, due = "queued", timezone.now() + timedelta(seconds=retry_delay(attempts))
+        stats["retried"] += 1
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, next_attempt_at=due, last_error=str(exc)[:1000],
+    )
+
+
+def purge_finished_mail(batch_size=1000, sleep=0.0):
+    """
+    Delete sent and failed rows older than EMAIL_QUEUE_KEEP_DAYS in batches
+    of `batch_size`, each its own short transaction; return how many went.
+    """
+    # finished rows keep next_attempt_at from their last attempt: the (status, next_attempt_at) index
+    cutoff = timezone.now() - timedelta(days=_setting("EMAIL_QUEUE_KEEP_DAYS", 7))
+    finished = OutboundEmail.objects.filter(status__in=("sent", "failed"), next_attempt_at__lt=cutoff)
+    total = 0
+    while True:
+        ids = list(finished.order_by("next_attempt_at").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return total
+        deleted, _ = OutboundEmail.objects.filter(id__in=ids).delete()
+        total += deleted
+        if sleep:
+            time.sleep(sleep)
@@ -0,0 +1,439 @@
+# core/management/commands/benchmark.py
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+from django.utils import timezone
+
+from core import events, geo, throttling
+from core.serializers import CustomTokenObtainPairSerializer
+from core.models import (
+    District, Notification, Property, Region, User, UserNotification, fan_out_notification, mark_notifications_read,
+)
+
+
+class Rollback(Exception):
+    """Raised to discard everything a scenario wrote."""
+
+
+def _legacy_mark_all_read(user):
+    # Pre-bulk implementation, kept for comparison only.
+    for n in Notification.objects.filter(is_active=True):
+        un, _ = UserNotification.objects.get_or_create(user=user, notification=n)
+        un.read = True
+        un.read_at = timezone.now()
+        un.save()
+
+
+def _legacy_login(identifier, password):
+    # Pre-rewrite lookup: up to three queries and a second hash via authenticate().
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.models import update_last_login
+
+    for field in ("username", "email", "phone"):
+        user = User.objects.filter(**{field: identifier}).first()
+        if user is not None:
+            break
+    if user is None or not user.check_password(password):
+        return None
+    user = authenticate(username=user.username, password=password)
+    update_last_login(None, user)
+    return user
+
+
+def _synthetic_boundaries(regions=36, districts_per_region=6, vertices=2000):
+    """
+    Jagged region outlines on a grid over Tanzania's bounding box, each cut
+    into district wedges. Stand-in for real boundary data of similar size.
+    """
+    rnd = random.Random(42)
+    cols = int(math.ceil(math.sqrt(regions)))
+    width, height = (40.5 - 29.3) / cols, (11.8 - 1.0) / cols
+    features = []
+    for i in range(regions):
+        cx = 29.3 + (i % cols + 0.5) * width
+        cy = -11.8 + (i // cols + 0.5) * height
+        radius = [min(width, height) * 0.5 * rnd.uniform(0.85, 1.0) for _ in range(vertices)]
+
+        def point(k):
+            angle = 2 * math.pi * k / vertices
+            return [cx + radius[k % vertices] * math.cos(angle), cy + radius[k % vertices] * math.sin(angle)]
+
+        name = f"Bench Region {i}"
+        features.append({"properties": {"region": name}, "geometry": {"type": "Polygon", "coordinates": [[point(k) for k in range(vertices)]]}})
+        step = vertices // districts_per_region
+        for d in range(districts_per_region):
+            ring = [[cx, cy]] + [point(k) for k in range(d * step, (d + 1) * step + 1)]
+            features.append({
+                "properties": {"region": name, "district": f"Bench District {i}-{d}"},
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+            })
+    return features
+
+
+class Command(BaseCommand):
+    help = (
+        "Run micro-benchmarks for hot code paths. Every scenario runs inside a "
+        "transaction that is rolled back, but point it at a scratch database anyway."
+    )
+
+    scenarios = {
+        "notifications": ([10, 1000, 10000], "bench_notifications"),
+        "fanout": ([1000, 10000, 100000], "bench_fanout"),
+        "sse": ([1000, 5000, 10000], "bench_sse"),
+        "login": ([10, 50], "bench_login"),
+        "throttle": ([1000, 10000, 100000], "bench_throttle"),
+        "geocode": ([10000, 100000], "bench_geocode"),
+        "sqlite": ([2000, 10000], "bench_sqlite"),
+        "connections": ([200, 1000], "bench_connections"),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(self.scenarios))
+        parser.add_argument("--sizes", nargs="+", type=int, help="Override the default problem sizes.")
+        parser.add_argument("--legacy", action="store_true", help="Also time the previous implementation.")
+        parser.add_argument("--socket-dir", help="sse: route events through worker sockets in this directory.")
+        parser.add_argument("--writers", type=int, default=4, help="sqlite: concurrent writer threads.")
+        parser.add_argument("--readers", type=int, default=4, help="sqlite: concurrent reader threads.")
+
+    def handle(self, *args, **options):
+        default_sizes, method = self.scenarios[options["scenario"]]
+        sizes = options["sizes"] or default_sizes
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    getattr(self, method)(size, **options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _measure(self, label, size, fn):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<28} n={size:<7} {elapsed * 1000:10.2f} ms  {queries:6d} queries")
+
+    # ---------------- scenarios ----------------
+    def bench_notifications(self, size, **options):
+        if size < 1:
+            raise CommandError("sizes must be positive")
+        user = User.objects.create(username=f"bench-notifications-{size}")
+        Notification.objects.bulk_create(
+            [Notification(title=f"n{i}", message="benchmark") for i in range(size)], batch_size=500
+        )
+        # the fan-out job has written a feed row for every notification
+        UserNotification.objects.bulk_create(
+            [UserNotification(user=user, notification_id=nid) for nid in Notification.objects.values_list("id", flat=True)],
+            batch_size=500,
+        )
+
+        if options.get("legacy"):
+            sid = transaction.savepoint()
+            self._measure("mark_all_read (legacy)", size, lambda: _legacy_mark_all_read(user))
+            transaction.savepoint_rollback(sid)
+
+        self._measure("mark_all_read", size, lambda: mark_notifications_read(user))
+        self._measure("mark_all_read (repeat)", size, lambda: mark_notifications_read(user))
+        first = Notification.objects.first()
+        self._measure("mark_read (single)", size, lambda: mark_notifications_read(user, first))
+
+    def bench_fanout(self, size, **options):
+        if size < 1:
+            raise CommandError("sizes must be positive")
+        User.objects.bulk_create(
+            [User(username=f"bench-fanout-{size}-{i}", password="!") for i in range(size)], batch_size=1000
+        )
+        # created inside the rolled-back transaction, so the on-commit fan-out never fires
+        notification = Notification.objects.create(title="broadcast", message="benchmark")
+        self._measure("fan_out_notification", size, lambda: fan_out_notification(notification.pk))
+
+    def bench_sse(self, size, **options):
+        previous = events.broker
+        events.broker = events.EventBroker(options.get("socket_dir"))
+        try:
+            asyncio.run(self._sse_idle_connections(size))
+        finally:
+            events.broker = previous
+
+    async def _sse_idle_connections(self, size):
+        stop = asyncio.Event()
+        delivered = asyncio.Event()
+        received = 0
+
+        async def receive():
+            await stop.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal received
+            if message.get("body", b"").startswith(b"event:"):
+                received += 1
+                if received == size:
+                    delivered.set()
+
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(events.stream_events(uid, receive, send, heartbeat=3600)) for uid in range(size)]
+        while events.broker.connection_count() < size:
+            await asyncio.sleep(0.01)
+        connected = time.perf_counter() - start
+        per_conn = (tracemalloc.get_traced_memory()[0] - base) / size
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        events.broker.publish(None, {"type": "notification", "id": 0})
+        await asyncio.wait_for(delivered.wait(), timeout=60)
+        fanout = time.perf_counter() - start
+
+        stop.set()
+        await asyncio.gather(*tasks)
+        self.stdout.write(
+            f"sse idle connections        n={size:<7} connect {connected * 1000:8.1f} ms  "
+            f"{per_conn / 1024:6.1f} KiB/conn  broadcast {fanout * 1000:8.1f} ms"
+        )
+
+    def bench_login(self, size, **options):
+        if size < 1:
+            raise CommandError("sizes must be positive")
+        password = "bench-login-password"
+        user = User.objects.create_user(
+            f"bench-login-{size}", email=f"bench-login-{size}@example.com", phone=f"+2557{size:08d}", password=password,
+        )
+
+        def logins(identifier, secret):
+            for _ in range(size):
+                CustomTokenObtainPairSerializer(data={"username": identifier, "password": secret}).is_valid()
+
+        if options.get("legacy"):
+            self._measure("login by phone (legacy)", size, lambda: [_legacy_login(user.phone, password) for _ in range(size)])
+        self._measure("login by username", size, lambda: logins(user.username, password))
+        self._measure("login by phone", size, lambda: logins(user.phone, password))
+        self._measure("login wrong password", size, lambda: logins(user.phone, "wrong"))
+        self._measure("login unknown user", size, lambda: logins("nobody@example.com", password))
+
+    def bench_throttle(self, size, **options):
+        from django.contrib.auth.models import AnonymousUser
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.throttling import AnonRateThrottle
+
+        class View:
+            throttle_scope = "login"
+
+        rate = f"{size * 10}/min"  # high enough that every request is allowed
+        anon = type("BenchAnon", (throttling.AnonBucketThrottle,), {"rate": rate})
+        scoped = type("BenchScoped", (throttling.ScopedBucketThrottle,), {"THROTTLE_RATES": {"login": rate}})
+        legacy = type("BenchDRFAnon", (AnonRateThrottle,), {"rate": rate})
+        request = Request(APIRequestFactory().post("/api/auth/token/", REMOTE_ADDR="10.0.0.1"))
+        request.user = AnonymousUser()
+
+        previous = throttling._store
+        with tempfile.TemporaryDirectory() as tmp:
+            throttling._store = throttling.TokenBucketStore(os.path.join(tmp, "throttle.sqlite3"))
+            try:
+                self._time_per_call("store.take", size, lambda: throttling._store.take("bench", size, size))
+                self._time_per_call("AnonBucketThrottle", size, lambda: anon().allow_request(request, View))
+                self._time_per_call("ScopedBucketThrottle", size, lambda: scoped().allow_request(request, View))
+                if options.get("legacy"):
+                    self._time_per_call("DRF AnonRateThrottle (cache)", size, lambda: legacy().allow_request(request, View))
+            finally:
+                throttling._store = previous
+
+    def _time_per_call(self, label, size, fn):
+        start = time.perf_counter()
+        for _ in range(size):
+            fn()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<28} n={size:<7} {elapsed / size * 1e6:10.1f} us/request")
+
+    def bench_geocode(self, size, **options):
+        features = _synthetic_boundaries()
+        start = time.perf_counter()
+        geocoder = geo.Geocoder(features)
+        self.stdout.write(f"{'build index':<28} {len(features)} shapes {(time.perf_counter() - start) * 1000:10.2f} ms")
+
+        rnd = random.Random(size)
+        points = [(rnd.uniform(-11.8, -1.0), rnd.uniform(29.3, 40.5)) for _ in range(size)]
+        self._time_per_call("point lookup", size, lambda: geocoder.names(*points[rnd.randrange(size)]))
+
+        # end to end: backfill `size` listings without region/district
+        names = sorted({f["properties"]["region"] for f in features})
+        Region.objects.bulk_create([Region(name=n, slug=n.lower().replace(" ", "-")) for n in names])
+        region_ids = dict(Region.objects.filter(name__in=names).values_list("name", "id"))
+        District.objects.bulk_create([
+            District(region_id=region_ids[f["properties"]["region"]], name=f["properties"]["district"])
+            for f in features if f["properties"].get("district")
+        ])
+        landlord = User.objects.create(username=f"bench-geocode-{size}")
+        Property.objects.bulk_create(
+            [Property(landlord=landlord, title="geo", lat=lat, lng=lng) for lat, lng in points], batch_size=1000,
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "boundaries.geojson")
+            with open(path, "w") as f:
+                json.dump({"type": "FeatureCollection", "features": features}, f)
+            self._measure("geocode_properties backfill", size, lambda: call_command(
+                "geocode_properties", boundaries=path, stdout=self.stdout,
+            ))
+
+    def bench_sqlite(self, size, **options):
+        """
+        `size` write transactions (read a row, then insert one, like
+        get_or_create) spread over --writers threads while --readers threads
+        query, each thread on its own connection to a fresh database file,
+        with the stock options and with SQLITE_TUNED_OPTIONS.
+        """
+        for label, db_options in [("stock", {}), ("SQLITE_TUNED", settings.SQLITE_TUNED_OPTIONS)]:
+            with tempfile.TemporaryDirectory() as tmp:
+                self._sqlite_workload(
+                    label, size, os.path.join(tmp, "bench.sqlite3"), db_options, options["writers"], options["readers"],
+                )
+
+    def _sqlite_workload(self, label, size, path, db_options, writers, readers):
+        settings_dict = {**connection.settings_dict, "NAME": path, "OPTIONS": db_options, "TEST": {}}
+
+        def open_connection():
+            conn = SQLiteWrapper(settings_dict)
+            conn.ensure_connection()
+            return conn
+
+        setup = open_connection()
+        with setup.cursor() as cursor:
+            cursor.execute("CREATE TABLE bench (id INTEGER PRIMARY KEY, k INTEGER, v TEXT)")
+            cursor.execute("CREATE INDEX bench_k ON bench (k)")
+        setup.close()
+
+        begin = "BEGIN " + db_options.get("transaction_mode", "")  # what atomic() issues
+        done = threading.Event()
+        counts = {"writes": 0, "reads": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def tally(key, n=1):
+            with lock:
+                counts[key] += n
+
+        def writer(n, seed):
+            conn = open_connection()
+            rnd = random.Random(seed)
+            try:
+                with conn.cursor() as cursor:
+                    for _ in range(n):
+                        k = rnd.randrange(1000)
+                        try:
+                            cursor.execute(begin)
+                            cursor.execute("SELECT COUNT(*) FROM bench WHERE k = %s", [k])
+                            cursor.fetchone()
+                            cursor.execute("INSERT INTO bench (k, v) VALUES (%s, %s)", [k, "x" * 64])
+                            cursor.execute("COMMIT")
+                            tally("writes")
+                        except DatabaseError:
+                            tally("errors")
+                            try:
+                                cursor.execute("ROLLBACK")
+                            except DatabaseError:
+                                pass
+            finally:
+                conn.close()
+
+        def reader(seed):
+            conn = open_connection()
+            rnd = random.Random(seed)
+            reads = errors = 0
+            try:
+                with conn.cursor() as cursor:
+                    while not done.is_set():
+                        try:
+                            cursor.execute("SELECT id, v FROM bench WHERE k = %s", [rnd.randrange(1000)])
+                            cursor.fetchall()
+                            reads += 1
+                        except DatabaseError:
+                            errors += 1
+            finally:
+                conn.close()
+                tally("reads", reads)
+                tally("errors", errors)
+
+        per_writer = max(1, size // max(1, writers))
+        write_threads = [threading.Thread(target=writer, args=(per_writer, i)) for i in range(writers)]
+        read_threads = [threading.Thread(target=reader, args=(-i,)) for i in range(readers)]
+        start = time.perf_counter()
+        for t in write_threads + read_threads:
+            t.start()
+        for t in write_threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        for t in read_threads:
+            t.join()
+        self.stdout.write(
+            f"{label:<28} n={size:<7} {elapsed * 1000:10.2f} ms  "
+            f"{counts['writes'] / elapsed:8.0f} writes/s {counts['reads'] / elapsed:9.0f} reads/s "
+            f"{counts['errors']:6d} locked"
+        )
+
+    def bench_connections(self, size, **options):
+        """
+        `size` requests that each take a connection, run one query and release
+        it the way the request_finished handler does: a new connection per
+        request (no CONN_MAX_AGE), persistent connections, and on Postgres the
+        psycopg pool from settings.
+        """
+        base = {**connection.settings_dict, "TEST": {}}
+        db_options = {k: v for k, v in base["OPTIONS"].items() if k != "pool"}
+        variants = [
+            ("new connection per request", {**base, "CONN_MAX_AGE": 0, "OPTIONS": db_options}),
+            ("CONN_MAX_AGE=60", {**base, "CONN_MAX_AGE": 60, "OPTIONS": db_options}),
+        ]
+        if connection.vendor == "postgresql":
+            pool = base["OPTIONS"].get("pool") or {"min_size": 1, "max_size": 4}
+            variants.append(("psycopg pool", {**base, "CONN_MAX_AGE": 0, "OPTIONS": {**db_options, "pool": pool}}))
+
+        for i, (label, settings_dict) in enumerate(variants):
+            # a private alias: pools are kept per alias on the wrapper class
+            conn = type(connections[connection.alias])(settings_dict, alias=f"bench-connections-{i}")
+            opened = 0
+            get_new_connection = conn.get_new_connection
+
+            def counting(conn_params):
+                nonlocal opened
+                opened += 1
+                return get_new_connection(conn_params)
+
+            conn.get_new_connection = counting
+            start = time.perf_counter()
+            try:
+                for _ in range(size):
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                    conn.close_if_unusable_or_obsolete()
+                elapsed = time.perf_counter() - start
+                if getattr(conn, "pool", None):
+                    opened = conn.pool.get_stats().get("connections_num", opened)  # checkouts are not connects
+            finally:
+                conn.close()
+                if getattr(conn, "pool", None):
+                    conn.close_pool()
+            self.stdout.write(
+                f"{label:<28} n={size:<7} {elapsed / size * 1e6:10.1f} us/request  {opened:6d} connects"
+            )
@@ -0,0 +1,26 @@
+# core/management/commands/fanout_notifications.py
+from django.core.management.base import BaseCommand
+
+from core.models import Notification, fan_out_notification
+
+
+class Command(BaseCommand):
+    help = "Fan out notifications whose recipient rows were not (fully) written, e.g. after a restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--include-running",
+            action="store_true",
+            help="Also resume notifications marked running (only when no worker is processing them).",
+        )
+
+    def handle(self, *args, **options):
+        statuses = ["pending", "failed"]
+        if options["include_running"]:
+            statuses.append("running")
+        ids = list(Notification.objects.filter(fanout_status__in=statuses).order_by("created_at").values_list("id", flat=True))
+        for notification_id in ids:
+            total = fan_out_notification(notification_id, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Notification {notification_id}: {total} recipient(s)"))
+        self.stdout.write(self.style.SUCCESS(f"Done. Processed {len(ids)} notification(s)."))
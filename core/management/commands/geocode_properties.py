@@ -0,0 +1,60 @@
+# core/management/commands/geocode_properties.py
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from core.geo import Geocoder, get_geocoder
+from core.models import Property
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill missing Property region/district from lat/lng using the boundary polygons (GEO_BOUNDARIES_PATH), "
+        "or only the region from the bundled towns (GEO_TOWNS_PATH) when there are none. With polygons, "
+        "regions earlier guessed from the towns are resolved again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--boundaries", help="GeoJSON file to use instead of GEO_BOUNDARIES_PATH.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many listings would change.")
+
+    def handle(self, *args, **options):
+        geocoder = Geocoder.from_file(options["boundaries"]) if options["boundaries"] else get_geocoder()
+        if geocoder is None:
+            raise CommandError("No boundaries or towns file; set GEO_BOUNDARIES_PATH or pass --boundaries.")
+
+        qs = (
+            Property.objects.filter(lat__isnull=False, lng__isnull=False)
+            .filter(Q(region__isnull=True) | Q(district__isnull=True))
+            .values_list("id", "lat", "lng", "region_id", "district_id", "region_source")
+        )
+        scanned = unresolved = 0
+        # (region_id, district_id, region_source) -> ids: one UPDATE per distinct answer
+        updates = defaultdict(list)
+        for pk, lat, lng, region_id, district_id, source in qs.iterator(chunk_size=options["batch_size"]):
+            scanned += 1
+            found_region, found_district = geocoder.resolve(lat, lng)
+            new_region, new_source = region_id, source
+            if found_region is not None and (region_id is None or geocoder.replaces(source)):
+                new_region, new_source = found_region, geocoder.SOURCE
+            new_district = district_id or (found_district if found_region == new_region else None)
+            if (new_region, new_district, new_source) == (region_id, district_id, source):
+                unresolved += 1
+                continue
+            updates[(new_region, new_district, new_source)].append(pk)
+
+        changed = sum(len(ids) for ids in updates.values())
+        if not options["dry_run"]:
+            with transaction.atomic():
+                for (region_id, district_id, source), ids in updates.items():
+                    for i in range(0, len(ids), options["batch_size"]):
+                        Property.objects.filter(id__in=ids[i:i + options["batch_size"]]).update(
+                            region_id=region_id, district_id=district_id, region_source=source,
+                        )
+        verb = "Would update" if options["dry_run"] else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} listing(s). {verb} {changed}; {unresolved} could not be placed."
+        ))
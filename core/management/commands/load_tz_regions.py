@@ -1,102 +1,226 @@
 # core/management/commands/load_tz_regions.py
-import requests
-from bs4 import BeautifulSoup
-from django.core.management.base import BaseCommand
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils.text import slugify
+
+from core.caching import bump_bootstrap_version
+from core.geo import forget_region_ids
 from core.models import Region, District
 
 WIKI_REGIONS_URL = "https://en.wikipedia.org/wiki/Regions_of_Tanzania"
+BUNDLED_DATASET = os.path.join(os.path.dirname(__file__), "..", "..", "data", "tz_regions.json")
+DEFAULT_CACHE_DIR = os.path.join(settings.BASE_DIR, ".cache", "tz_regions")
+
+
+def read_dataset(path):
+    """
+    Return {region: [districts]} from a JSON file ([{"name", "districts"}])
+    or a CSV file with `region,district` columns.
+    """
+    regions = {}
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                region = (row.get("region") or "").strip()
+                if not region:
+                    continue
+                districts = regions.setdefault(region, [])
+                district = (row.get("district") or "").strip()
+                if district:
+                    districts.append(district)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for item in json.load(f):
+                regions.setdefault(item["name"].strip(), []).extend(d.strip() for d in item.get("districts", []) if d.strip())
+    return regions
+
+
+def _parser():
+    # lxml is several times faster than the pure-Python parser when installed
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+class PageCache:
+    """
+    Fetches pages once and keeps them as HTML snapshots on disk, so re-runs
+    are fast and reproducible (and possible offline).
+    """
+
+    def __init__(self, cache_dir, offline=False):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+    def get(self, url):
+        path = self.path(url)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        if self.offline:
+            return None
+        import requests
+
+        resp = requests.get(url, timeout=15)
+        if resp.status_code != 200:
+            return None
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(resp.text)
+        os.replace(tmp, path)
+        return resp.text
+
+
+def _candidate_links(html):
+    from bs4 import BeautifulSoup
+
+    content = BeautifulSoup(html, _parser()).find(id="mw-content-text")
+    names = set()
+    for a in content.find_all("a") if content else []:
+        txt = (a.get_text() or "").strip()
+        href = a.get("href") or ""
+        if not href.startswith("/wiki/"):
+            continue
+        if any(x in href.lower() for x in ["help:", "file:", "category"]):
+            continue
+        # region names are capitalized and short
+        if txt and len(txt) < 40 and txt[0].isupper():
+            names.add((txt, href))
+    return sorted(names)
+
+
+def _district_names(html):
+    """
+    District names from a region page, or None if the page is not about a region.
+    Same heuristics as the original scraper: tables mentioning districts,
+    falling back to list items.
+    """
+    from bs4 import BeautifulSoup
+
+    page = BeautifulSoup(html, _parser())
+    if "district" not in page.get_text().lower():
+        return None
+    names = set()
+    for tab in page.find_all("table"):
+        if "district" in tab.get_text().lower():
+            for td in tab.find_all(["td", "th"]):
+                text = td.get_text(separator=" ", strip=True)
+                if text and len(text) < 80 and "district" not in text.lower():
+                    for p in text.replace("\xa0", " ").split("\n"):
+                        p = p.strip()
+                        if 2 < len(p) < 60:
+                            names.add(p)
+    if not names:
+        for li in page.find_all("li"):
+            t = li.get_text(strip=True)
+            if len(t) < 80 and "district" in t.lower():
+                cleaned = t.replace("District", "").replace("district", "").strip(" -–:,.()")
+                if cleaned:
+                    names.add(cleaned)
+    return sorted({part.strip() for name in names for part in name.split(",") if part.strip()})
+
 
 class Command(BaseCommand):
-    help = "Load Tanzania regions and districts by scraping Wikipedia. Requires internet."
+    help = (
+        "Load Tanzania regions and districts. By default imports the bundled dataset "
+        "(core/data/tz_regions.json); --source takes another JSON/CSV file and --fetch "
+        "scrapes Wikipedia through an on-disk page cache. Existing rows are upserted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", help="JSON ([{name, districts}]) or CSV (region,district) file to import.")
+        parser.add_argument("--fetch", action="store_true", help="Scrape Wikipedia instead of reading a dataset.")
+        parser.add_argument("--offline", action="store_true", help="With --fetch: use cached HTML snapshots only.")
+        parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where fetched pages are cached.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent fetches with --fetch.")
+        parser.add_argument("--dump", help="Also write the imported data to this JSON file (e.g. to refresh the bundle).")
 
     def handle(self, *args, **options):
-        resp = requests.get(WIKI_REGIONS_URL, timeout=20)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        # Find the table or list containing regions. Wikipedia structure may change.
-        # We'll iterate over region links in the list of regions on the page.
-        region_links = []
-        # Try to find "List of regions" table or the contents of the list
-        # Simple heuristic: find all <a> inside the article that link to region pages and have "Region" or capital link nearby
-        content = soup.find(id='mw-content-text')
-        # collect region names by scanning list items and tables
-        candidate_anchors = content.find_all('a')
-        # We will collect unique region names from the "List of regions" part by matching link targets that exist as pages
-        names = set()
-        for a in candidate_anchors:
-            txt = (a.get_text() or '').strip()
-            href = a.get('href') or ''
-            if not href.startswith('/wiki/'):
-                continue
-            # skip irrelevant links
-            if any(x in href.lower() for x in ['help:', 'file:', 'category']):
-                continue
-            # Heuristic: region names are capitalized and not too long; we'll accept typical region names
-            if txt and len(txt) < 40 and txt[0].isupper():
-                names.add((txt, href))
-
-        self.stdout.write(f"Found candidate region link count: {len(names)} - attempting to resolve best matches")
-
-        # We'll go through a hand-picked subset by seeing if that page contains "Districts" or "Wards"
-        regions_created = 0
-        for txt, href in sorted(names):
-            # get the page
+        if options["fetch"]:
+            regions = self.scrape(PageCache(options["cache_dir"], offline=options["offline"]), options["workers"])
+        else:
+            path = options["source"] or BUNDLED_DATASET
+            if not os.path.exists(path):
+                raise CommandError(f"No such dataset: {path}")
+            regions = read_dataset(path)
+
+        if not regions:
+            raise CommandError("Nothing to import.")
+        region_count, district_count = self.upsert(regions)
+
+        if options["dump"]:
+            with open(options["dump"], "w", encoding="utf-8") as f:
+                json.dump([{"name": r, "districts": d} for r, d in sorted(regions.items())], f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Done. Upserted {region_count} region(s) and {district_count} district(s)."))
+
+    def scrape(self, pages, workers):
+        index = pages.get(WIKI_REGIONS_URL)
+        if index is None:
+            raise CommandError(f"Could not load {WIKI_REGIONS_URL} (offline without a cached copy?)")
+        links = _candidate_links(index)
+        self.stdout.write(f"Found candidate region link count: {len(links)}")
+
+        def visit(link):
+            txt, href = link
             try:
-                r = requests.get(f'https://en.wikipedia.org{href}', timeout=15)
-                if r.status_code != 200:
-                    continue
-                page = BeautifulSoup(r.text, 'html.parser')
-                page_text = page.get_text().lower()
-                # Only accept candidate if the page mentions 'district' or 'districts'
-                if 'district' not in page_text:
-                    continue
-                # create region
-                reg, _ = Region.objects.get_or_create(name=txt, slug=slugify(txt))
-                regions_created += 1
-                # find district names on the page (common patterns: tables, lists with 'District' or 'districts')
-                district_names = set()
-                # search for tables with header containing "District"
-                tables = page.find_all('table')
-                for tab in tables:
-                    if 'district' in tab.get_text().lower():
-                        # extract text from table rows
-                        for td in tab.find_all(['td', 'th']):
-                            text = td.get_text(separator=' ', strip=True)
-                            if text and len(text) < 80 and 'district' not in text.lower():
-                                # split by commas or newlines
-                                parts = [p.strip() for p in text.replace('\xa0', ' ').split('\n') if p.strip()]
-                                for p in parts:
-                                    if len(p) > 2 and len(p) < 60:
-                                        district_names.add(p)
-                # fallback: look for lists <li>
-                if not district_names:
-                    for li in page.find_all('li'):
-                        t = li.get_text(strip=True)
-                        # often district names are short phrases, avoid long descriptions
-                        if len(t) < 80 and 'district' in t.lower():
-                            # remove the word 'district' and parentheses
-                            cleaned = t.replace('District','').replace('district','').strip(' -–:,.()')
-                            if cleaned:
-                                district_names.add(cleaned)
-                # Final pass: split on commas for any lines that look like lists
-                final_dnames = set()
-                for dn in district_names:
-                    for part in dn.split(','):
-                        p = part.strip()
-                        if p:
-                            final_dnames.add(p)
-
-                # Create district records
-                created = 0
-                for dname in sorted(final_dnames):
-                    District.objects.get_or_create(region=reg, name=dname)
-                    created += 1
-
-                self.stdout.write(self.style.SUCCESS(f"Region: {reg.name} - districts added: {created}"))
+                html = pages.get(f"https://en.wikipedia.org{href}")
+                return txt, _district_names(html) if html else None
             except Exception as e:
                 self.stderr.write(f"Skipping {txt} due to error: {e}")
+                return txt, None
 
-        self.stdout.write(self.style.SUCCESS(f"Regions processed: {regions_created}"))
-        self.stdout.write("Done. Inspect the DB for Regions and Districts. If some districts look wrong, you can manually edit them in admin.")
+        regions = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for txt, districts in pool.map(visit, links):
+                if districts is not None:
+                    regions[txt] = districts
+        return regions
+
+    @transaction.atomic
+    def upsert(self, regions):
+        names = sorted(regions)
+        # rows already there may differ in case ("ARUSHA") or carry their own slug:
+        # match them by name, case-insensitively, and keep their slug
+        existing_slugs = {}
+        for name, slug in Region.objects.values_list("name", "slug"):
+            if name in regions or name.lower() not in existing_slugs:  # an exact match wins
+                existing_slugs[name.lower()] = slug
+        Region.objects.bulk_create(
+            [Region(name=name, slug=existing_slugs.get(name.lower()) or slugify(name)) for name in names],
+            update_conflicts=True, unique_fields=["slug"], update_fields=["name"],
+        )
+        region_ids = dict(Region.objects.filter(name__in=names).values_list("name", "id"))
+
+        rows = District.objects.filter(region_id__in=region_ids.values()).values_list("id", "region_id", "name")
+        exact = {(region_id, name) for _, region_id, name in rows}
+        folded = {(region_id, name.lower()): pk for pk, region_id, name in rows}
+        created, renamed = [], []
+        for name in names:
+            region_id = region_ids[name]
+            for district in sorted({d.lower(): d for d in regions[name]}.values()):
+                if (region_id, district) in exact:
+                    continue
+                pk = folded.get((region_id, district.lower()))
+                if pk is None:
+                    created.append(District(region_id=region_id, name=district))
+                else:
+                    renamed.append(District(pk=pk, region_id=region_id, name=district))
+        District.objects.bulk_update(renamed, ["name"], batch_size=500)
+        District.objects.bulk_create(created, batch_size=500)
+        # bulk_create sends no post_save, so refresh /api/bootstrap/ and the geocoder explicitly
+        transaction.on_commit(bump_bootstrap_version)
+        transaction.on_commit(forget_region_ids)
+        return len(names), sum(len(set(map(str.lower, regions[name]))) for name in names)
@@ -0,0 +1,29 @@
+# core/management/commands/process_account_deletions.py
+from django.core.management.base import BaseCommand
+
+from core.deletion import delete_account
+from core.models import AccountDeletion
+
+
+class Command(BaseCommand):
+    help = "Carry out account deletions that have not finished, e.g. after a restart."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--include-running",
+            action="store_true",
+            help="Also resume deletions marked running (only when no worker is processing them).",
+        )
+
+    def handle(self, *args, **options):
+        statuses = ["pending", "failed"]
+        if options["include_running"]:
+            statuses.append("running")
+        ids = list(AccountDeletion.objects.filter(status__in=statuses).order_by("requested_at").values_list("id", flat=True))
+        for deletion_id in ids:
+            deletion = delete_account(deletion_id, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"{deletion.username}: {deletion.rows_deleted} row(s), {deletion.files_deleted} file(s) deleted"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Done. Processed {len(ids)} deletion(s)."))
@@ -0,0 +1,40 @@
+# core/management/commands/purge_password_reset_otps.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import PasswordResetOTP
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired and used password reset codes in small batches, each in "
+        "its own short transaction. Safe to run from cron every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        cutoff = PasswordResetOTP.expiry_cutoff()
+        # expired rows via the created_at index, then the few used-but-recent ones
+        expired = PasswordResetOTP.objects.filter(created_at__lt=cutoff)
+        used = PasswordResetOTP.objects.filter(created_at__gte=cutoff, is_used=True)
+
+        if options["dry_run"]:
+            self.stdout.write(f"Would delete {expired.count()} expired and {used.count()} used code(s).")
+            return
+
+        total = 0
+        for qs in (expired, used):
+            while True:
+                ids = list(qs.order_by("created_at").values_list("id", flat=True)[:options["batch_size"]])
+                if not ids:
+                    break
+                deleted, _ = PasswordResetOTP.objects.filter(id__in=ids).delete()
+                total += deleted
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Done. Deleted {total} password reset code(s)."))
@@ -0,0 +1,15 @@
+# core/management/commands/reconcile_badges.py
+from django.core.management.base import BaseCommand
+
+from core.models import refresh_unread_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute unread badge counters from source tables. Run periodically (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only reconcile these user ids.")
+
+    def handle(self, *args, **options):
+        updated = refresh_unread_counters(options["users"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} counter(s)."))
@@ -0,0 +1,56 @@
+# core/management/commands/send_queued_email.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.mail import purge_finished_mail, send_queued_mail
+from core.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = "Send queued outbound emails, reusing one connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Emails per connection (default EMAIL_QUEUE_BATCH_SIZE).")
+        parser.add_argument("--max-attempts", type=int, help="Give up after this many tries (default EMAIL_QUEUE_MAX_ATTEMPTS).")
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting when the queue is empty.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep between polls with --loop.")
+        parser.add_argument("--stats", action="store_true", help="Only print queue size per status.")
+        parser.add_argument(
+            "--purge", action="store_true",
+            help="Only delete sent and failed emails older than EMAIL_QUEUE_KEEP_DAYS, in batches (for cron).",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge"]:
+            deleted = purge_finished_mail()
+            self.stdout.write(self.style.SUCCESS(f"Done. Deleted {deleted} finished email(s)."))
+            return
+
+        if options["stats"]:
+            for row in OutboundEmail.objects.values("status").annotate(n=Count("id")).order_by("status"):
+                self.stdout.write(f"{row['status']:<8} {row['n']}")
+            return
+
+        totals = {"sent": 0, "retried": 0, "failed": 0}
+        try:
+            while True:
+                stats = send_queued_mail(batch_size=options["batch_size"], max_attempts=options["max_attempts"])
+                if stats["claimed"]:
+                    for key in totals:
+                        totals[key] += stats[key]
+                    rate = stats["sent"] / stats["seconds"] if stats["seconds"] else 0
+                    self.stdout.write(
+                        f"batch: sent={stats['sent']} retried={stats['retried']} failed={stats['failed']} "
+                        f"{stats['seconds']:.2f}s ({rate:.1f} msg/s)"
+                    )
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. sent={totals['sent']} retried={totals['retried']} failed={totals['failed']}"
+        ))
@@ -0,0 +1,81 @@
+# core/management/commands/slowqueries.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.slowqueries import log_files, read_samples, rotate, summarize
+
+SORT_KEYS = {"total": "total_ms", "count": "count", "mean": "mean_ms", "max": "max_ms"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Rank the queries in the slow-query log (SLOW_QUERY_LOG and the files it was rotated to) "
+        "by fingerprint. FULL SCAN marks plans that read a whole table. --rotate moves the log aside "
+        "instead (run it daily from cron unless logrotate does this)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", help="Log file to read (default SLOW_QUERY_LOG).")
+        parser.add_argument("--hours", type=float, help="Only samples from the last N hours.")
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="total", help="Rank by this column.")
+        parser.add_argument("--limit", type=int, default=20, help="How many fingerprints to list.")
+        parser.add_argument("--show", metavar="FINGERPRINT", help="Print the SQL, plan, views and callers of one fingerprint.")
+        parser.add_argument(
+            "--rotate", action="store_true",
+            help="Rotate the log, keeping SLOW_QUERY_LOG_KEEP older files, and rank nothing.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rotate"]:
+            path = options["log"] or settings.SLOW_QUERY_LOG
+            if rotate(path):
+                self.stdout.write(self.style.SUCCESS(f"Rotated {path}."))
+            else:
+                self.stdout.write(f"Nothing to rotate at {path}.")
+            return
+        paths = log_files(options["log"])
+        if not paths:
+            raise CommandError(f"No slow-query log at {options['log'] or settings.SLOW_QUERY_LOG}.")
+        since = None
+        if options["hours"]:
+            since = (timezone.now() - timezone.timedelta(hours=options["hours"])).isoformat()
+        groups = summarize(read_samples(paths, since))
+
+        if options["show"]:
+            matches = [g for g in groups if g["fingerprint"].startswith(options["show"])]
+            if not matches:
+                raise CommandError(f"No samples for fingerprint {options['show']}.")
+            for g in matches:
+                self.show(g)
+            return
+
+        key = SORT_KEYS[options["sort"]]
+        groups.sort(key=lambda g: g[key], reverse=True)
+        self.stdout.write(
+            f"{'fingerprint':<12} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}  "
+            f"{'plan':<9} top view / sql"
+        )
+        for g in groups[:options["limit"]]:
+            top_view = max(g["views"], key=g["views"].get) if g["views"] else "-"
+            self.stdout.write(
+                f"{g['fingerprint']:<12} {g['count']:>6} {g['total_ms']:>10.0f} {g['mean_ms']:>9.1f} "
+                f"{g['max_ms']:>9.1f}  {'FULL SCAN' if g['full_scan'] else '':<9} {top_view}"
+            )
+            self.stdout.write(f"{'':<12} {g['sql'][:110]}")
+        total = sum(g["count"] for g in groups)
+        self.stdout.write(self.style.SUCCESS(f"{total} slow queries, {len(groups)} fingerprints."))
+
+    def show(self, g):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{g['fingerprint']}: {g['count']} samples, {g['total_ms']:.0f} ms total, "
+            f"{g['mean_ms']:.1f} ms mean, {g['max_ms']:.1f} ms max, last {g['last_seen']}"
+        ))
+        self.stdout.write(g["sql"])
+        self.stdout.write("plan:")
+        for line in g["plan"] or ["(not captured)"]:
+            self.stdout.write(f"  {line}")
+        for label in ("views", "callers"):
+            self.stdout.write(f"{label}:")
+            for name, n in sorted(g[label].items(), key=lambda item: -item[1]):
+                self.stdout.write(f"  {n:>6}  {name}")
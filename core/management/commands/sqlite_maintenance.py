@@ -0,0 +1,51 @@
+# core/management/commands/sqlite_maintenance.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint the SQLite write-ahead log and refresh query planner statistics "
+        "(PRAGMA optimize). Run it periodically, or with --loop, when SQLITE_TUNED is on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database alias to maintain.")
+        parser.add_argument(
+            "--mode", default="TRUNCATE", choices=["PASSIVE", "FULL", "RESTART", "TRUNCATE"],
+            help="wal_checkpoint mode; TRUNCATE also shrinks the -wal file back to zero bytes.",
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep running instead of exiting after one pass.")
+        parser.add_argument("--interval", type=float, default=300.0, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        conn = connections[options["database"]]
+        if conn.vendor != "sqlite":
+            raise CommandError(f"{options['database']} is a {conn.vendor} database, not SQLite.")
+        try:
+            while True:
+                self.run_once(conn, options["mode"])
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+    def run_once(self, conn, mode):
+        start = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+            busy, log_frames, checkpointed = cursor.fetchone()
+            cursor.execute("PRAGMA optimize")
+        elapsed = (time.perf_counter() - start) * 1000
+        if log_frames == -1:
+            self.stdout.write(f"not in WAL mode; optimized in {elapsed:.1f} ms")
+        elif busy:
+            # readers or a writer held the log; the next pass catches up
+            self.stdout.write(self.style.WARNING(
+                f"checkpoint incomplete: {checkpointed}/{log_frames} frames ({elapsed:.1f} ms)"
+            ))
+        else:
+            self.stdout.write(f"checkpointed {checkpointed}/{log_frames} frames and optimized in {elapsed:.1f} ms")
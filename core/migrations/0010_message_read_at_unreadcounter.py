@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-19 08:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_read(apps, schema_editor):
+    """
+    Messages had no read state before this field: treat history as read so
+    upgraded inboxes don't light up with every message ever received.
+    """
+    Message = apps.get_model('core', 'Message')
+    Message.objects.filter(read_at__isnull=True).update(read_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_propertyimage_thumbnail_alter_facility_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notifications', models.IntegerField(default=0)),
+                ('messages', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_read, migrations.RunPython.noop),
+    ]
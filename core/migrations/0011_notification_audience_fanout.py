@@ -0,0 +1,84 @@
+# Generated by Django 5.2.9 on 2026-10-19 08:30
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def fan_out_existing(apps, schema_editor):
+    """
+    Notifications created before targeting were global: give every active
+    user a feed row for them, and date existing rows by their notification.
+    """
+    User = apps.get_model('core', 'User')
+    Notification = apps.get_model('core', 'Notification')
+    UserNotification = apps.get_model('core', 'UserNotification')
+
+    UserNotification.objects.update(
+        created_at=Subquery(Notification.objects.filter(pk=OuterRef('notification_id')).values('created_at')[:1])
+    )
+
+    user_ids = list(User.objects.filter(is_active=True).values_list('id', flat=True))
+    for n in Notification.objects.all().iterator(chunk_size=100):
+        UserNotification.objects.bulk_create(
+            [UserNotification(user_id=uid, notification_id=n.pk, created_at=n.created_at) for uid in user_ids],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+    Notification.objects.update(fanout_status='done', fanout_count=len(user_ids), fanned_out_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_message_read_at_unreadcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='fanned_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='fanout_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='fanout_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='send_to_all',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_regions',
+            field=models.ManyToManyField(blank=True, help_text='Users with listings or applications in these regions', related_name='notifications', to='core.region'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_role',
+            field=models.CharField(blank=True, choices=[('landlord', 'Landlord'), ('renter', 'Renter')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_users',
+            field=models.ManyToManyField(blank=True, related_name='targeted_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='usernotification',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='usernotification',
+            index=models.Index(fields=['user', '-created_at'], name='usernotif_user_created_idx'),
+        ),
+        migrations.RunPython(fan_out_existing, migrations.RunPython.noop),
+    ]
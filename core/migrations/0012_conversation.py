@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-19 08:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_conversations(apps, schema_editor):
+    Message = apps.get_model('core', 'Message')
+    Conversation = apps.get_model('core', 'Conversation')
+
+    threads = {}
+    for m in Message.objects.order_by('created_at', 'id').iterator(chunk_size=2000):
+        sides = [(m.sender_id, m.receiver_id, False)]
+        if m.sender_id != m.receiver_id:
+            sides.append((m.receiver_id, m.sender_id, m.read_at is None))
+        for owner_id, peer_id, unread in sides:
+            row = threads.setdefault((owner_id, peer_id), Conversation(owner_id=owner_id, peer_id=peer_id))
+            row.last_message_id = m.pk
+            row.last_message_at = m.created_at
+            row.unread_count += int(unread)
+    Conversation.objects.bulk_create(threads.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_notification_audience_fanout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', '-created_at'], name='message_thread_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='peer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['owner', '-last_message_at'], name='conversation_inbox_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversation',
+            unique_together={('owner', 'peer')},
+        ),
+        migrations.RunPython(build_conversations, migrations.RunPython.noop),
+    ]
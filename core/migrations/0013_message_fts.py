@@ -0,0 +1,58 @@
+# Full-text index for message search (see core/search.py).
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE core_message_fts USING fts5(text, owners, tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER core_message_fts_insert AFTER INSERT ON core_message BEGIN
+        INSERT INTO core_message_fts(rowid, text, owners)
+        VALUES (new.id, new.text, 'u' || new.sender_id || ' u' || new.receiver_id);
+    END""",
+    """CREATE TRIGGER core_message_fts_delete AFTER DELETE ON core_message BEGIN
+        DELETE FROM core_message_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER core_message_fts_update AFTER UPDATE OF text, sender_id, receiver_id ON core_message BEGIN
+        DELETE FROM core_message_fts WHERE rowid = old.id;
+        INSERT INTO core_message_fts(rowid, text, owners)
+        VALUES (new.id, new.text, 'u' || new.sender_id || ' u' || new.receiver_id);
+    END""",
+    """INSERT INTO core_message_fts(rowid, text, owners)
+        SELECT id, text, 'u' || sender_id || ' u' || receiver_id FROM core_message""",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_message_fts_update",
+    "DROP TRIGGER IF EXISTS core_message_fts_delete",
+    "DROP TRIGGER IF EXISTS core_message_fts_insert",
+    "DROP TABLE IF EXISTS core_message_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX core_message_text_fts ON core_message USING GIN (to_tsvector('simple'::regconfig, COALESCE(text, '')))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_message_text_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_conversation'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-19 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(fields=['user', 'code', 'is_used', '-created_at'], name='otp_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetotp',
+            index=models.Index(fields=['created_at'], name='otp_created_idx'),
+        ),
+    ]
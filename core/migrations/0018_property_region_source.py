@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='region_source',
+            field=models.CharField(blank=True, choices=[('', 'Chosen'), ('boundaries', 'Boundary polygons'), ('towns', 'Nearest town')], default='', editable=False, max_length=10),
+        ),
+    ]
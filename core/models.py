@@ -4,11 +4,17 @@ from io import BytesIO
 
 from django.conf import settings
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from PIL import Image
 
+from .events import publish_event
+from .instrumentation import timed
+from .tasks import run_in_background
+
 # AUTH user reference (string in settings)
 User = settings.AUTH_USER_MODEL
 
@@ -16,6 +22,7 @@ User = settings.AUTH_USER_MODEL
 # ------------------------------
 # Image optimization helper
 # ------------------------------
+@timed("image")
 def optimize_image_file(uploaded_file, max_width=1200, quality=75, convert_to_webp=True):
     """
     Accepts an UploadedFile or a file-like object.
@@ -69,6 +76,13 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="renter")
     phone = models.CharField(max_length=30, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # login accepts email or phone as the identifier
+            models.Index(fields=["email"], name="user_email_idx"),
+            models.Index(fields=["phone"], name="user_phone_idx"),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -177,6 +191,8 @@ class Property(models.Model):
 
     LISTING_TYPES = (("sale", "For Sale"), ("rent", "For Rent"))
 
+    REGION_SOURCES = (("", "Chosen"), ("boundaries", "Boundary polygons"), ("towns", "Nearest town"))
+
     landlord = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="properties")
     region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name="properties")
     district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name="properties")
@@ -187,6 +203,8 @@ class Property(models.Model):
 
     lat = models.FloatField(null=True, blank=True)
     lng = models.FloatField(null=True, blank=True)
+    # how region was filled in; a "towns" guess is replaced once boundary polygons are configured
+    region_source = models.CharField(max_length=10, choices=REGION_SOURCES, default="", blank=True, editable=False)
 
     property_type = models.CharField(max_length=20, choices=PROPERTY_TYPES, default="house")
     category = models.CharField(max_length=10, choices=LISTING_TYPES, default="rent", help_text="Defines whether property is for SALE or RENT")
@@ -229,6 +247,22 @@ class Property(models.Model):
             if self.bathrooms == "":
                 self.bathrooms = None
 
+    def save(self, *args, **kwargs):
+        # fill a missing region/district from the coordinates; never override a chosen one
+        if self.lat is not None and self.lng is not None and (self.region_id is None or self.district_id is None):
+            from .geo import get_geocoder
+
+            geocoder = get_geocoder()
+            region_id, district_id = geocoder.resolve(self.lat, self.lng) if geocoder else (None, None)
+            if region_id is not None and (self.region_id is None or geocoder.replaces(self.region_source)):
+                self.region_id, self.region_source = region_id, geocoder.SOURCE
+            if self.district_id is None and district_id is not None and region_id == self.region_id:
+                self.district_id = district_id
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and region_id is not None:
+                kwargs["update_fields"] = {*update_fields, "region", "district", "region_source"}
+        super().save(*args, **kwargs)
+
 
 # =========================
 # PROPERTY IMAGES
@@ -296,6 +330,47 @@ class Application(models.Model):
         return f"{self.property.title} - {self.status}"
 
 
+def bulk_set_application_status(landlord, updates, reject_others_for_property=None):
+    """
+    Apply {application_id: status} for applications on `landlord`'s
+    properties and optionally reject every other pending application of
+    one property. One locking SELECT plus one conditional UPDATE in a
+    transaction. Returns (changed_rows, unchanged_ids, not_found_ids); each
+    changed row has id, status, renter_id, property_id, property__title.
+    """
+    targets = models.Q(id__in=list(updates))
+    if reject_others_for_property is not None:
+        targets |= models.Q(property_id=reject_others_for_property, status="pending")
+
+    with transaction.atomic():
+        rows = list(
+            Application.objects.select_for_update()
+            .filter(targets, property__landlord=landlord)
+            .values("id", "status", "renter_id", "property_id", "property__title")
+        )
+        changed, unchanged = [], []
+        for row in rows:
+            new_status = updates.get(row["id"], "rejected")
+            if new_status == row["status"]:
+                unchanged.append(row["id"])
+            else:
+                row["status"] = new_status
+                changed.append(row)
+        if changed:
+            by_status = {}
+            for row in changed:
+                by_status.setdefault(row["status"], []).append(row["id"])
+            Application.objects.filter(id__in=[r["id"] for r in changed]).update(
+                status=models.Case(
+                    *[models.When(id__in=ids, then=models.Value(st)) for st, ids in by_status.items()],
+                    output_field=models.CharField(),
+                )
+            )
+    found = {row["id"] for row in rows}
+    not_found = [pk for pk in updates if pk not in found]
+    return changed, unchanged, not_found
+
+
 # =========================
 # MESSAGES
 # =========================
@@ -304,6 +379,96 @@ class Message(models.Model):
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="received_messages")
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # both directions of a thread are (sender, receiver) equality lookups
+            models.Index(fields=["sender", "receiver", "-created_at"], name="message_thread_idx"),
+        ]
+
+
+class Conversation(models.Model):
+    """
+    The owner's view of their thread with `peer`: one row per participant,
+    updated whenever a message between them is created or deleted.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="conversations")
+    peer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("owner", "peer")
+        ordering = ["-last_message_at"]
+        indexes = [
+            models.Index(fields=["owner", "-last_message_at"], name="conversation_inbox_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} <-> {self.peer_id}"
+
+
+def thread_messages(user, peer):
+    return Message.objects.filter(
+        models.Q(sender=user, receiver=peer) | models.Q(sender=peer, receiver=user)
+    )
+
+
+def record_message(message):
+    """
+    Point both participants' Conversation rows at a newly created message and
+    bump the receiver's unread count.
+    """
+    sides = [(message.sender_id, message.receiver_id, 0)]
+    if message.receiver_id != message.sender_id:
+        sides.append((message.receiver_id, message.sender_id, 1 if message.read_at is None else 0))
+    with transaction.atomic():
+        for owner_id, peer_id, unread in sides:
+            changes = {"last_message": message, "last_message_at": message.created_at}
+            if unread:
+                changes["unread_count"] = F("unread_count") + unread
+            if not Conversation.objects.filter(owner_id=owner_id, peer_id=peer_id).update(**changes):
+                _, created = Conversation.objects.get_or_create(
+                    owner_id=owner_id, peer_id=peer_id,
+                    defaults={"last_message": message, "last_message_at": message.created_at, "unread_count": unread},
+                )
+                if not created:
+                    Conversation.objects.filter(owner_id=owner_id, peer_id=peer_id).update(**changes)
+
+
+def mark_thread_read(user, peer_id, up_to=None):
+    """
+    Mark messages from `peer_id` to `user` read (up to message id `up_to`)
+    with one UPDATE, and move the thread and badge counters by the same
+    amount in the same transaction. Returns the number of messages marked.
+    """
+    with transaction.atomic():
+        unread = Message.objects.filter(sender_id=peer_id, receiver=user, read_at__isnull=True)
+        if up_to is not None:
+            unread = unread.filter(id__lte=up_to)
+        marked = unread.update(read_at=timezone.now())
+        if marked:
+            Conversation.objects.filter(owner=user, peer_id=peer_id).update(unread_count=F("unread_count") - marked)
+            bump_unread_counters([user.pk], messages=-marked)
+    return marked
+
+
+def forget_message(message):
+    """
+    Re-point both Conversation rows after `message` was deleted.
+    """
+    latest = thread_messages(message.sender_id, message.receiver_id).order_by("-created_at", "-id").first()
+    rows = Conversation.objects.filter(
+        models.Q(owner_id=message.sender_id, peer_id=message.receiver_id)
+        | models.Q(owner_id=message.receiver_id, peer_id=message.sender_id)
+    )
+    rows.update(last_message=latest, last_message_at=latest.created_at if latest else None)
+    if message.read_at is None and message.receiver_id != message.sender_id:
+        Conversation.objects.filter(owner_id=message.receiver_id, peer_id=message.sender_id).update(
+            unread_count=F("unread_count") - 1
+        )
 
 
 # =========================
@@ -337,39 +502,399 @@ class Banner(models.Model):
 # OTP / Password Reset
 # =========================
 class PasswordResetOTP(models.Model):
+    LIFETIME = timezone.timedelta(minutes=10)
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     code = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
     is_used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "code", "is_used", "-created_at"], name="otp_lookup_idx"),
+            # purge_password_reset_otps walks this
+            models.Index(fields=["created_at"], name="otp_created_idx"),
+        ]
+
+    @classmethod
+    def expiry_cutoff(cls):
+        return timezone.now() - cls.LIFETIME
+
+    @classmethod
+    def lookup(cls, email, code):
+        """
+        Latest unused OTP for (email, code), annotated with `expired`, or None.
+        Expiry is decided by the database in the same query.
+        """
+        return (
+            cls.objects.filter(user__email=email, code=code, is_used=False)
+            .annotate(expired=models.ExpressionWrapper(
+                models.Q(created_at__lt=cls.expiry_cutoff()), output_field=models.BooleanField(),
+            ))
+            .select_related("user")
+            .order_by("-created_at")
+            .first()
+        )
+
+    def consume(self):
+        """
+        Mark this OTP used if it is still unused and unexpired; returns whether
+        it was. Two concurrent resets with the same code cannot both win.
+        """
+        return bool(
+            PasswordResetOTP.objects.filter(pk=self.pk, is_used=False, created_at__gte=self.expiry_cutoff())
+            .update(is_used=True)
+        )
+
     def is_expired(self):
-        return timezone.now() > self.created_at + timezone.timedelta(minutes=10)
+        return timezone.now() > self.created_at + self.LIFETIME
 
     def __str__(self):
         return f"{self.user} - {self.code}"
 
 
+# =========================
+# ACCOUNT DELETION (carried out by core/deletion.py)
+# =========================
+class AccountDeletion(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    # plain ids, not foreign keys: this row outlives the user it describes
+    user_id = models.PositiveIntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    step = models.CharField(max_length=50, blank=True)
+    rows_deleted = models.PositiveIntegerField(default=0)
+    files_deleted = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-requested_at"]
+
+    def __str__(self):
+        return f"{self.username} ({self.status})"
+
+
+# =========================
+# OUTBOUND EMAIL QUEUE (drained by core/mail.py)
+# =========================
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # due time while queued; lease expiry while sending
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outboundemail_due_idx"),
+        ]
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
 # =========================
 # NOTIFICATIONS
 # =========================
 class Notification(models.Model):
+    FANOUT_STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
     title = models.CharField(max_length=200)
     message = models.TextField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # audience: everyone, or (role AND region segment) plus explicit users
+    send_to_all = models.BooleanField(default=True)
+    target_role = models.CharField(max_length=20, choices=User.ROLE_CHOICES, blank=True)
+    target_regions = models.ManyToManyField(Region, blank=True, related_name="notifications", help_text="Users with listings or applications in these regions")
+    target_users = models.ManyToManyField(settings.AUTH_USER_MODEL, blank=True, related_name="targeted_notifications")
+
+    fanout_status = models.CharField(max_length=10, choices=FANOUT_STATUS_CHOICES, default="pending")
+    fanout_count = models.PositiveIntegerField(default=0)
+    fanned_out_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-created_at"]
 
     def __str__(self):
         return self.title
 
+    def recipient_ids(self):
+        """
+        Queryset of active user ids this notification is addressed to.
+        """
+        users = User.objects.filter(is_active=True)
+        if self.send_to_all:
+            return users.values_list("id", flat=True)
+
+        segment = models.Q(pk__in=[])
+        region_ids = list(self.target_regions.values_list("id", flat=True))
+        if self.target_role or region_ids:
+            segment = models.Q()
+            if self.target_role:
+                segment &= models.Q(role=self.target_role)
+            if region_ids:
+                segment &= models.Q(pk__in=Property.objects.filter(region_id__in=region_ids).values("landlord_id")) | models.Q(
+                    pk__in=Application.objects.filter(property__region_id__in=region_ids).values("renter_id")
+                )
+        explicit = models.Q(pk__in=self.target_users.through.objects.filter(notification_id=self.pk).values("user_id"))
+        return users.filter(segment | explicit).values_list("id", flat=True)
+
 
 class UserNotification(models.Model):
+    """
+    One row per recipient, written by the fan-out job; this is the feed.
+    """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
     read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ("user", "notification")
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="usernotif_user_created_idx"),
+        ]
+
+
+def fan_out_notification(notification_id, batch_size=1000):
+    """
+    Write a UserNotification row for every recipient of the notification
+    in batches of `batch_size`, bumping their badge counters as it goes.
+    Safe to re-run: a pending run skips recipients who already have a
+    row, so after an audience edit (see schedule_fan_out) only the added
+    users are bumped and notified; a resumed run recomputes the counters
+    of every recipient instead.
+    """
+    notification = Notification.objects.get(pk=notification_id)
+    if notification.fanout_status == "done":
+        return notification.fanout_count
+    resumed = notification.fanout_status != "pending"
+    claimed = Notification.objects.filter(pk=notification_id, fanout_status=notification.fanout_status).update(
+        fanout_status="running"
+    )
+    if not claimed:
+        # a run scheduled by the same edit got there first
+        return notification.fanout_count
+    recipients = notification.recipient_ids()
+    total = 0
+    if not resumed:
+        delivered = UserNotification.objects.filter(notification_id=notification_id)
+        total = delivered.count()
+        recipients = recipients.exclude(pk__in=delivered.values("user_id"))
+
+    batch = []
+
+    def flush():
+        UserNotification.objects.bulk_create(
+            [UserNotification(user_id=uid, notification_id=notification_id, created_at=notification.created_at) for uid in batch],
+            ignore_conflicts=True,
+        )
+        if notification.is_active:
+            if resumed:
+                refresh_unread_counters(batch)
+            else:
+                bump_unread_counters(batch, notifications=1)
+            if not notification.send_to_all:
+                publish_event(batch, "notification", id=notification_id)
+
+    try:
+        for uid in recipients.order_by().iterator(chunk_size=batch_size):
+            batch.append(uid)
+            if len(batch) >= batch_size:
+                flush()
+                total += len(batch)
+                batch = []
+        if batch:
+            flush()
+            total += len(batch)
+    except Exception:
+        Notification.objects.filter(pk=notification_id).update(fanout_status="failed", fanout_count=total)
+        raise
+
+    # an edit that arrived meanwhile set it back to pending: leave that for its own run
+    Notification.objects.filter(pk=notification_id, fanout_status="running").update(
+        fanout_status="done", fanout_count=total, fanned_out_at=timezone.now()
+    )
+    if notification.send_to_all and notification.is_active:
+        publish_event(None, "notification", id=notification_id)
+    return total
+
+
+def schedule_fan_out(notification_id):
+    """
+    Fan out (again) once the current transaction commits, e.g. after the
+    audience of a notification changed.
+    """
+    Notification.objects.filter(pk=notification_id).exclude(fanout_status="pending").update(fanout_status="pending")
+    run_in_background(fan_out_notification, notification_id)
+
+
+def deliver_broadcasts(user_id):
+    """
+    Give a new user a feed row for every notification addressed to all
+    users, or to their whole role, dated like the notification.
+    """
+    user = User.objects.get(pk=user_id)
+    ids = Notification.objects.filter(
+        models.Q(send_to_all=True) | models.Q(target_role=user.role, target_regions=None)
+    ).values_list("id", "created_at")
+    UserNotification.objects.bulk_create(
+        [UserNotification(user_id=user_id, notification_id=nid, created_at=created_at) for nid, created_at in ids],
+        ignore_conflicts=True,
+    )
+    refresh_unread_counters([user_id])
+
+
+# =========================
+# UNREAD BADGE COUNTERS
+# =========================
+class UnreadCounter(models.Model):
+    """
+    Denormalized per-user unread counts served by the badge endpoint.
+    Kept current by signal handlers and explicit bumps; `reconcile_badges`
+    recomputes them from the source tables.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="unread_counter")
+    notifications = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.notifications} notifications, {self.messages} messages"
+
+
+def _count_subquery(qs):
+    return Coalesce(
+        Subquery(qs.order_by().annotate(_count=Func(F("pk"), function="COUNT")).values("_count")[:1]),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def notify_application_status(rows):
+    """
+    Queue one targeted notification per (property, status) group of rows
+    returned by bulk_set_application_status; delivery is the usual fan-out.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["property_id"], row["property__title"], row["status"]), []).append(row["renter_id"])
+    with transaction.atomic():
+        for (_, title, status), renter_ids in groups.items():
+            notification = Notification.objects.create(
+                title=f"Application {status}",
+                message=f'Your application for "{title}" was {status}.',
+                send_to_all=False,
+            )
+            Notification.target_users.through.objects.bulk_create(
+                [Notification.target_users.through(notification=notification, user_id=uid) for uid in renter_ids]
+            )
+
+
+def unread_counter_expressions(user_ref):
+    """
+    Expressions computing the unread counts for the user referenced by
+    `user_ref` (an OuterRef or a user id).
+    """
+    unread_notifications = UserNotification.objects.filter(user=user_ref, read=False, notification__is_active=True)
+    unread_messages = Message.objects.filter(receiver=user_ref, read_at__isnull=True)
+    return {
+        "notifications": _count_subquery(unread_notifications),
+        "messages": _count_subquery(unread_messages),
+    }
+
+
+def refresh_unread_counters(user_ids=None):
+    """
+    Recompute counters from source tables in one UPDATE. `user_ids=None`
+    reconciles every existing counter row.
+    """
+    qs = UnreadCounter.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    return qs.update(**unread_counter_expressions(OuterRef("user_id")))
+
+
+def get_unread_counts(user):
+    """
+    Return (notifications, messages) for `user`: one query when the counter
+    row exists, otherwise it is computed and stored.
+    """
+    row = UnreadCounter.objects.filter(user_id=user.pk).values_list("notifications", "messages").first()
+    if row is None:
+        counts = (
+            User.objects.filter(pk=user.pk)
+            .annotate(**unread_counter_expressions(user.pk))
+            .values_list("notifications", "messages")
+            .get()
+        )
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user_id=user.pk, notifications=counts[0], messages=counts[1])],
+            ignore_conflicts=True,
+        )
+        row = counts
+    return max(row[0], 0), max(row[1], 0)
+
+
+def bump_unread_counters(user_ids=None, notifications=0, messages=0):
+    """
+    Apply deltas to existing counters; `user_ids=None` targets every user.
+    Users without a counter row get one computed on their next poll.
+    """
+    qs = UnreadCounter.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    changes = {}
+    if notifications:
+        changes["notifications"] = F("notifications") + notifications
+    if messages:
+        changes["messages"] = F("messages") + messages
+    if changes:
+        qs.update(**changes)
+
+
+def mark_notifications_read(user, notification=None):
+    """
+    Mark the user's feed rows read with a single UPDATE: one notification
+    when `notification` is given, otherwise all of them.
+    """
+    rows = UserNotification.objects.filter(user=user, read=False)
+    if notification is not None:
+        rows = rows.filter(notification=notification)
+    updated = rows.update(read=True, read_at=timezone.now())
+    if notification is None:
+        UnreadCounter.objects.filter(user_id=user.pk).update(notifications=0)
+    elif updated and notification.is_active:
+        bump_unread_counters([user.pk], notifications=-updated)
+    return updated
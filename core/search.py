@@ -0,0 +1,148 @@
+# core/search.py
+"""
+Full-text search over a user's messages.
+
+On SQLite, messages are indexed in the FTS5 table `core_message_fts`
+(created and kept in sync by triggers in migration 0013). Each row also
+carries an `owners` column ("u<sender> u<receiver>") so the per-user
+scope is resolved inside the index instead of by filtering every match.
+On PostgreSQL the GIN expression index from the same migration is used.
+"""
+import base64
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Message
+
+FTS_TABLE = "core_message_fts"
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 12
+# the database marks matches with these (private-use code points); the text is
+# escaped before they become tags, so message content never reaches the client as HTML
+_MATCH_START = "\ue000"
+_MATCH_END = "\ue001"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(f"{rank!r}:{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(rank), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_MATCH_START, SNIPPET_START).replace(_MATCH_END, SNIPPET_END)
+
+
+def _fts_query(tokens, user_id):
+    # quote every token so user input cannot inject FTS syntax; prefix-match the last one
+    terms = " ".join(f'"{t}"' for t in tokens[:-1])
+    terms = f'{terms} "{tokens[-1]}"*'.strip()
+    return f'text : ({terms}) AND owners : "u{user_id}"'
+
+
+def search_messages(user, query, cursor=None, limit=20):
+    """
+    Return (rows, next_cursor) for messages of `user` matching `query`,
+    best match first. Each row: id, sender_id, receiver_id, created_at,
+    snippet (HTML-escaped, matches wrapped in <mark>) and rank (lower is
+    better).
+    """
+    tokens = _TOKEN_RE.findall(query or "")
+    if not tokens:
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+    if connection.vendor == "sqlite":
+        rows = _search_sqlite(user.pk, tokens, after, limit + 1)
+    elif connection.vendor == "postgresql":
+        rows = _search_postgres(user.pk, tokens, after, limit + 1)
+    else:
+        rows = _search_fallback(user.pk, tokens, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["rank"], rows[-1]["id"])
+    return rows, next_cursor
+
+
+def _search_sqlite(user_id, tokens, after, limit):
+    rank = f"bm25({FTS_TABLE}, 1.0, 0.0)"
+    sql = (
+        f"SELECT m.id, m.sender_id, m.receiver_id, m.created_at, "
+        f"snippet({FTS_TABLE}, 0, %s, %s, '…', %s), {rank} AS rank "
+        f"FROM {FTS_TABLE} JOIN core_message m ON m.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [_MATCH_START, _MATCH_END, SNIPPET_TOKENS, _fts_query(tokens, user_id)]
+    if after:
+        sql += f" AND ({rank} > %s OR ({rank} = %s AND m.id > %s))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY rank, m.id LIMIT %s"
+    params.append(limit)
+
+    created_col = Message._meta.get_field("created_at").get_col(Message._meta.db_table)
+    converters = connection.ops.get_db_converters(created_col)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+    rows = []
+    for pk, sender_id, receiver_id, created_at, snippet, score in result:
+        for converter in converters:
+            created_at = converter(created_at, created_col, connection)
+        rows.append({
+            "id": pk,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "created_at": created_at,
+            "snippet": _highlight(snippet),
+            "rank": score,
+        })
+    return rows
+
+
+def _search_postgres(user_id, tokens, after, limit):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    vector = SearchVector("text", config="simple")
+    search = SearchQuery(" & ".join(f"{t}:*" for t in tokens), config="simple", search_type="raw")
+    qs = (
+        Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+        .annotate(document=vector)
+        .filter(document=search)
+        # negate so that, as with bm25, lower is better
+        .annotate(rank=-SearchRank(vector, search))
+        .annotate(snippet=SearchHeadline(
+            "text", search, config="simple", start_sel=_MATCH_START, stop_sel=_MATCH_END, max_words=SNIPPET_TOKENS,
+        ))
+    )
+    if after:
+        qs = qs.filter(Q(rank__gt=after[0]) | Q(rank=after[0], id__gt=after[1]))
+    rows = list(qs.order_by("rank", "id").values("id", "sender_id", "receiver_id", "created_at", "snippet", "rank")[:limit])
+    for row in rows:
+        row["snippet"] = _highlight(row["snippet"])
+    return rows
+
+
+def _search_fallback(user_id, tokens, after, limit):
+    # no full-text index on this backend: plain substring match, oldest first
+    qs = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+    for t in tokens:
+        qs = qs.filter(text__icontains=t)
+    if after:
+        qs = qs.filter(id__gt=after[1])
+    rows = list(qs.order_by("id").values("id", "sender_id", "receiver_id", "created_at", "text")[:limit])
+    for row in rows:
+        row["snippet"] = html.escape(row.pop("text")[:200])
+        row["rank"] = 0.0
+    return rows
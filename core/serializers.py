@@ -1,25 +1,33 @@
 # core/serializers.py
 import json
+import logging
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.contrib.auth.models import update_last_login
+from django.conf import settings
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 from rest_framework import serializers
 from .models import Notification, UserNotification
 from rest_framework import serializers
 from django.contrib.auth import password_validation
 from django.utils.translation import gettext_lazy as _
+from .facilities import resolve_facilities
+from .instrumentation import TimedSerializerMixin
 from .models import (
     Banner, Region, District, Property, PropertyImage,
-    Application, Message, Facility
+    Application, Message, Facility, Conversation
 )
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 # ---------------- User ----------------
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # allow frontend 'name' to map to first_name
     name = serializers.CharField(source='first_name', required=False, allow_blank=True)
     # Allow file upload and normal representation for avatar
@@ -46,6 +54,18 @@ class UserSerializer(serializers.ModelSerializer):
         return rep
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact user for lists (inbox peers, application renters).
+    """
+    name = serializers.CharField(source='first_name', read_only=True)
+    avatar = serializers.ImageField(read_only=True, use_url=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'name', 'avatar', 'role']
+
+
 # ---------------- Register ----------------
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -108,6 +128,29 @@ class FacilitySerializer(serializers.ModelSerializer):
         fields = ["id", "key", "name"]
 
 
+class FacilityListField(serializers.Field):
+    """
+    Write-only list of facilities given as ids, keys or names, in any of the
+    shapes clients send; resolves to Facility ids without touching the DB.
+    """
+
+    @staticmethod
+    def raw_value(data, name):
+        # multipart forms may repeat the field once per facility
+        if hasattr(data, 'getlist'):
+            values = data.getlist(name)
+            return values if len(values) > 1 else data.get(name)
+        return data.get(name)
+
+    def get_value(self, dictionary):
+        if self.field_name not in dictionary:
+            return serializers.empty
+        return self.raw_value(dictionary, self.field_name)
+
+    def to_internal_value(self, data):
+        return resolve_facilities(data)
+
+
 # ---------------- Banner ----------------
 class BannerSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
@@ -127,7 +170,7 @@ class BannerSerializer(serializers.ModelSerializer):
 
 
 # ---------------- Property ----------------
-class PropertySerializer(serializers.ModelSerializer):
+class PropertySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     landlord = UserSerializer(read_only=True)
     images = PropertyImageSerializer(many=True, read_only=True)
     region = RegionSerializer(read_only=True)
@@ -136,10 +179,9 @@ class PropertySerializer(serializers.ModelSerializer):
     # facilities read + write
     facilities = FacilitySerializer(many=True, read_only=True)
 
-    # Accept "facility_ids": [1,2] in JSON body (mapped to 'facilities' internally)
-    facility_ids = serializers.PrimaryKeyRelatedField(
-        queryset=Facility.objects.all(), many=True, write_only=True, required=False, source='facilities'
-    )
+    # Accept "facility_ids": [1,2] in JSON body (mapped to 'facilities' internally);
+    # ids, keys and names all resolve through the facility registry
+    facility_ids = FacilityListField(write_only=True, required=False, source='facilities')
 
     # write-only FK fields for incoming ids
     region_id = serializers.PrimaryKeyRelatedField(
@@ -160,92 +202,6 @@ class PropertySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'landlord', 'images', 'created_at', 'facilities']
 
-    def _parse_facilities_input(self, raw):
-        """
-        Accepts raw input from initial_data (string JSON, comma-separated, or list).
-        Returns a list/queryset of Facility instances (can be empty list).
-        Supports numeric ids, string keys (facility.key) or names.
-        """
-        if raw is None:
-            return []
-
-        # if the frontend sent a JSON string, try to parse
-        if isinstance(raw, str):
-            raw_str = raw.strip()
-            # handle comma-separated like "wifi,gym"
-            if raw_str.startswith('[') or raw_str.startswith('{'):
-                try:
-                    parsed = json.loads(raw_str)
-                except Exception:
-                    parsed = raw_str
-            elif ',' in raw_str:
-                parsed = [s.strip() for s in raw_str.split(',') if s.strip()]
-            else:
-                # single token e.g. "wifi" or "1"
-                parsed = [raw_str]
-        else:
-            parsed = raw
-
-        if parsed is None:
-            return []
-
-        # normalize to list
-        if not isinstance(parsed, (list, tuple)):
-            parsed = [parsed]
-
-        # separate numeric ids and potential keys/names
-        ids = []
-        keys = []
-        names = []
-        for item in parsed:
-            if item is None:
-                continue
-            if isinstance(item, (int,)):
-                ids.append(int(item))
-                continue
-            s = str(item).strip()
-            if s == '':
-                continue
-            # numeric-looking strings
-            if s.isdigit():
-                ids.append(int(s))
-                continue
-            # otherwise treat as key/name
-            keys.append(s)
-
-        found = []
-        if ids:
-            qs = Facility.objects.filter(id__in=ids)
-            found.extend(list(qs))
-        if keys:
-            # first try key field (exact)
-            qs_key = Facility.objects.filter(key__in=keys)
-            found_keys = {str(f.key) for f in qs_key}
-            found.extend(list(qs_key))
-            # try keys not matched -> try name case-insensitive
-            remaining = [k for k in keys if k not in found_keys]
-            if remaining:
-                qs_name = Facility.objects.filter(name__iexact__in=remaining)
-                # NOTE: name__iexact__in is not supported directly in all Django versions; instead iterate
-                # fall back to manual lookup:
-                extra = []
-                for r in remaining:
-                    try:
-                        f = Facility.objects.filter(name__iexact=r).first()
-                        if f:
-                            extra.append(f)
-                    except Exception:
-                        pass
-                found.extend(extra)
-        # dedupe by id
-        unique = []
-        seen = set()
-        for f in found:
-            if f and f.id not in seen:
-                seen.add(f.id)
-                unique.append(f)
-        return unique
-
     def _get_incoming_facilities(self):
         """
         Return list of Facility instances based on validated_data or raw initial_data.
@@ -290,6 +246,13 @@ class PropertySerializer(serializers.ModelSerializer):
             if (data.get('bedrooms') is None) and (getattr(self.instance, 'bedrooms', None) is None):
                 errors['bedrooms'] = 'Number of bedrooms is recommended for houses.'
 
+        # forms send the list as "facilities" (JSON, comma-separated or repeated keys)
+        if 'facilities' not in data and 'facilities' in self.initial_data:
+            try:
+                data['facilities'] = resolve_facilities(FacilityListField.raw_value(self.initial_data, 'facilities'))
+            except serializers.ValidationError as exc:
+                errors['facilities'] = exc.detail
+
         if errors:
             raise serializers.ValidationError(errors)
         return data
@@ -318,16 +281,9 @@ class PropertySerializer(serializers.ModelSerializer):
         """
         request = self.context.get('request', None)
 
-        # Primary path: DRF will put facility instances in 'facilities' when facility_ids was present.
+        # facility ids resolved in facility_ids / validate()
         facilities = validated_data.pop('facilities', None)
 
-        # If none found in validated_data, try parsing raw incoming data (forms may send strings)
-        if facilities is None and request is not None:
-            raw = request.data.get('facility_ids') or request.data.get('facilities')
-            if raw is not None:
-                parsed = self._parse_facilities_input(raw)
-                facilities = parsed
-
         # protect landlord from client-provided value
         validated_data.pop('landlord', None)
 
@@ -341,12 +297,12 @@ class PropertySerializer(serializers.ModelSerializer):
         else:
             prop = Property.objects.create(**validated_data)
 
-        # attach facilities if any (list of model instances)
+        # attach facilities if any (list of ids)
         if facilities is not None:
             try:
                 prop.facilities.set(facilities)
-            except Exception as e:
-                print("[DEBUG] Failed to set facilities on create:", e, "incoming:", facilities)
+            except Exception:
+                logger.warning("could not set facilities %s on property %s", facilities, prop.id, exc_info=True)
 
         # handle images
         if request is not None:
@@ -360,12 +316,7 @@ class PropertySerializer(serializers.ModelSerializer):
                 PropertyImage.objects.create(property=prop, image=f)
                 existing_names.add(short)
 
-        # debug log
-        try:
-            print("[DEBUG] Created Property id:", prop.id, "facilities after create:", list(prop.facilities.values_list("id", "key", "name")))
-        except Exception:
-            pass
-
+        logger.debug("created property %s with facilities %s", prop.id, facilities)
         return prop
 
     def update(self, instance, validated_data):
@@ -374,17 +325,12 @@ class PropertySerializer(serializers.ModelSerializer):
         """
         request = self.context.get('request', None)
 
-        # Primary path: DRF validated 'facilities' when facility_ids present
+        # facility ids resolved in facility_ids / validate(); None = not sent, leave as is
         facilities = validated_data.pop('facilities', None)
 
-        # If not present, try parsing raw incoming data (forms might send strings)
-        if facilities is None and request is not None:
-            # only update facilities if client provided something
-            if 'facility_ids' in request.data or 'facilities' in request.data:
-                raw = request.data.get('facility_ids') or request.data.get('facilities')
-                facilities = self._parse_facilities_input(raw)
-
         validated_data.pop('landlord', None)  # do not allow landlord change
+        if validated_data.get('region') is not None:
+            validated_data['region_source'] = ''  # the lister's choice now, not a guess
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -393,8 +339,8 @@ class PropertySerializer(serializers.ModelSerializer):
         if facilities is not None:
             try:
                 instance.facilities.set(facilities)
-            except Exception as e:
-                print("[DEBUG] Failed to set facilities on update:", e, "incoming:", facilities)
+            except Exception:
+                logger.warning("could not set facilities %s on property %s", facilities, instance.id, exc_info=True)
 
         if request is not None:
             uploaded = request.FILES.getlist('images')
@@ -407,19 +353,47 @@ class PropertySerializer(serializers.ModelSerializer):
                 PropertyImage.objects.create(property=instance, image=f)
                 existing_names.add(short)
 
-        # debug
-        try:
-            print("[DEBUG] Updated Property id:", instance.id, "facilities after update:", list(instance.facilities.values_list("id", "key", "name")))
-        except Exception:
-            pass
-
+        logger.debug("updated property %s, facilities %s", instance.id, "unchanged" if facilities is None else facilities)
         return instance
 
 
 # ---------------- Application ----------------
-class ApplicationSerializer(serializers.ModelSerializer):
-    renter = UserSerializer(read_only=True)
-    property = PropertySerializer(read_only=True)
+class PropertySummarySerializer(serializers.ModelSerializer):
+    """
+    Compact property for application lists. Expects region/district to be
+    select_related and images prefetched (see ApplicationViewSet).
+    """
+    region = serializers.CharField(source='region.name', read_only=True, default=None)
+    district = serializers.CharField(source='district.name', read_only=True, default=None)
+    cover = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Property
+        fields = [
+            'id', 'title', 'property_type', 'category', 'price', 'monthly_rent',
+            'region', 'district', 'is_available', 'cover',
+        ]
+        read_only_fields = fields
+
+    def get_cover(self, obj):
+        images = obj.images.all()
+        if not images:
+            return None
+        first = images[0]
+        f = first.thumbnail or first.image
+        url = f.url
+        request = self.context.get('request')
+        if request is not None:
+            try:
+                return request.build_absolute_uri(url)
+            except Exception:
+                pass
+        return url
+
+
+class ApplicationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    renter = UserSummarySerializer(read_only=True)
+    property = PropertySummarySerializer(read_only=True)
     property_id = serializers.PrimaryKeyRelatedField(
         queryset=Property.objects.all(), write_only=True, source='property'
     )
@@ -434,8 +408,29 @@ class ApplicationSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ApplicationStatusItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Application.STATUS_CHOICES)
+
+
+class ApplicationBulkStatusSerializer(serializers.Serializer):
+    """
+    {"updates": [{"id": 1, "status": "accepted"}, ...],
+     "reject_others_for_property": 5,   # reject remaining pending applications
+     "notify": true}                    # notify renters of their new status
+    """
+    updates = ApplicationStatusItemSerializer(many=True, required=False, default=list)
+    reject_others_for_property = serializers.IntegerField(required=False, allow_null=True, default=None)
+    notify = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if not data['updates'] and data['reject_others_for_property'] is None:
+            raise serializers.ValidationError("Provide updates and/or reject_others_for_property.")
+        return data
+
+
 # ---------------- Message ----------------
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     receiver = UserSerializer(read_only=True)
     receiver_id = serializers.PrimaryKeyRelatedField(
@@ -444,50 +439,96 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ['id', 'sender', 'receiver', 'receiver_id', 'text', 'created_at']
-        read_only_fields = ['id', 'sender', 'created_at']
+        fields = ['id', 'sender', 'receiver', 'receiver_id', 'text', 'created_at', 'read_at']
+        read_only_fields = ['id', 'sender', 'created_at', 'read_at']
 
     def create(self, validated_data):
         validated_data['sender'] = self.context['request'].user
         return super().create(validated_data)
 
 
+# ---------------- Conversations ----------------
+class ThreadMessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Compact message row for thread views: participants are known from the URL.
+    """
+    class Meta:
+        model = Message
+        fields = ['id', 'sender_id', 'receiver_id', 'text', 'created_at', 'read_at']
+        read_only_fields = fields
+
+
+class ConversationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    peer = UserSummarySerializer(read_only=True)
+    last_message = ThreadMessageSerializer(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['peer', 'last_message', 'last_message_at', 'unread_count']
+        read_only_fields = fields
+
+
 # ---------------- Custom Token ----------------
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
     Allow login by username, email or phone. Returns tokens plus user info.
+
+    The identifier is resolved with one indexed query (username wins over
+    email, email over phone) and the password hash is checked exactly once;
+    last_login is only written when older than LAST_LOGIN_UPDATE_INTERVAL.
     """
     username_field = 'username'
 
+    @staticmethod
+    def resolve_user(identifier):
+        # rank before limiting, so many email/phone matches cannot crowd out the username
+        return (
+            User.objects.filter(Q(username=identifier) | Q(email=identifier) | Q(phone=identifier))
+            .order_by(
+                Case(
+                    When(username=identifier, then=Value(0)),
+                    When(email=identifier, then=Value(1)),
+                    default=Value(2),
+                ),
+                'pk',
+            )
+            .first()
+        )
+
     def validate(self, attrs):
-        username_or_email_or_phone = attrs.get('username')
+        identifier = attrs.get('username')
         password = attrs.get('password')
 
-        user = None
-        try:
-            user = User.objects.get(username=username_or_email_or_phone)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(email=username_or_email_or_phone)
-            except User.DoesNotExist:
-                try:
-                    user = User.objects.get(phone=username_or_email_or_phone)
-                except User.DoesNotExist:
-                    raise serializers.ValidationError('No active account found with the given credentials')
-
-        if user and user.check_password(password):
-            data = super().validate({'username': user.username, 'password': password})
-            update_last_login(None, user)
-            data.update({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': getattr(user, 'role', None),
-                'phone': getattr(user, 'phone', None),
-            })
-            return data
-
-        raise serializers.ValidationError('No active account found with the given credentials')
+        user = self.resolve_user(identifier) if identifier else None
+        if user is None:
+            # hash anyway so unknown identifiers take as long as wrong passwords
+            User().set_password(password)
+            raise serializers.ValidationError(self.error_messages['no_active_account'])
+
+        if not user.check_password(password) or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise serializers.ValidationError(self.error_messages['no_active_account'])
+
+        self.user = user
+        refresh = self.get_token(user)
+        self._touch_last_login(user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'role': getattr(user, 'role', None),
+            'phone': getattr(user, 'phone', None),
+        }
+
+    @staticmethod
+    def _touch_last_login(user):
+        now = timezone.now()
+        interval = getattr(settings, 'LAST_LOGIN_UPDATE_INTERVAL', 300)
+        if user.last_login is None or (now - user.last_login).total_seconds() >= interval:
+            # plain UPDATE: no full-row save and no post_save fan-out
+            User.objects.filter(pk=user.pk).update(last_login=now)
+            user.last_login = now
 
 
 
@@ -551,12 +592,18 @@ class ResetPasswordSerializer(serializers.Serializer):
 
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     read = serializers.SerializerMethodField()
+    target_regions = serializers.PrimaryKeyRelatedField(queryset=Region.objects.all(), many=True, required=False)
+    target_users = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), many=True, required=False)
 
     class Meta:
         model = Notification
-        fields = ('id','title','message','is_active','send_to_all','created_at','read')
+        fields = (
+            'id', 'title', 'message', 'is_active', 'send_to_all', 'target_role',
+            'target_regions', 'target_users', 'fanout_status', 'fanout_count', 'created_at', 'read',
+        )
+        read_only_fields = ('fanout_status', 'fanout_count', 'created_at')
 
     def get_read(self, obj):
         user = self.context.get('request').user
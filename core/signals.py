@@ -0,0 +1,217 @@
+# core/signals.py
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .caching import bump_bootstrap_version, bump_facility_version, invalidate_landlord_dashboard
+from .events import publish_event
+from .geo import forget_region_ids
+from .models import (
+    Application,
+    Banner,
+    District,
+    Facility,
+    Message,
+    Notification,
+    Property,
+    PropertyImage,
+    Region,
+    User,
+    UserNotification,
+    bump_unread_counters,
+    deliver_broadcasts,
+    fan_out_notification,
+    forget_message,
+    record_message,
+    refresh_unread_counters,
+    schedule_fan_out,
+)
+from .slowqueries import install_wrapper as install_slow_query_wrapper
+from .tasks import run_in_background
+
+
+# =========================
+# UNREAD BADGE COUNTERS
+# =========================
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    if created and instance.read_at is None:
+        bump_unread_counters([instance.receiver_id], messages=1)
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, **kwargs):
+    if instance.read_at is None:
+        bump_unread_counters([instance.receiver_id], messages=-1)
+
+
+_AUDIENCE_FIELDS = ("send_to_all", "target_role", "is_active")
+
+
+@receiver(pre_save, sender=Notification)
+def notification_saving(sender, instance, update_fields=None, **kwargs):
+    # the values post_save compares against; bookkeeping saves of other fields skip the lookup
+    instance._stored = None
+    if instance._state.adding or (update_fields is not None and not set(_AUDIENCE_FIELDS) & set(update_fields)):
+        return
+    instance._stored = Notification.objects.filter(pk=instance.pk).values(*_AUDIENCE_FIELDS).first()
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        # audience m2m is saved after the row; fan out once it all commits
+        run_in_background(fan_out_notification, instance.pk)
+        return
+    stored = getattr(instance, "_stored", None)
+    if not stored:
+        return
+    changed = {field for field, value in stored.items() if getattr(instance, field) != value}
+    if {"send_to_all", "target_role"} & changed:
+        # the audience may have grown; the re-run only writes missing rows
+        schedule_fan_out(instance.pk)
+    if "is_active" in changed:
+        # only users holding an unread feed row for it see their badge move
+        refresh_unread_counters(
+            UserNotification.objects.filter(notification=instance, read=False).values("user_id")
+        )
+
+
+@receiver(m2m_changed, sender=Notification.target_users.through)
+@receiver(m2m_changed, sender=Notification.target_regions.through)
+def notification_targets_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    # reverse: region.notifications.add(...) / user.targeted_notifications.add(...)
+    for notification_id in pk_set if reverse else [instance.pk]:
+        schedule_fan_out(notification_id)
+
+
+@receiver(post_save, sender=User)
+def user_registered(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # broadcasts sent before they joined
+        run_in_background(deliver_broadcasts, instance.pk)
+
+
+@receiver(pre_delete, sender=Notification)
+def notification_deleting(sender, instance, **kwargs):
+    # the cascade then removes the feed in one DELETE: UserNotification has no receivers
+    instance._unread_by = list(
+        UserNotification.objects.filter(notification=instance, read=False).values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    user_ids = getattr(instance, "_unread_by", None)
+    if user_ids:
+        refresh_unread_counters(user_ids)
+
+
+# =========================
+# AUTHENTICATED USER CACHE
+# =========================
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    # again after commit, in case a concurrent request cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+# =========================
+# LANDLORD DASHBOARD CACHE
+# =========================
+def _landlord_of(property_id):
+    return Property.objects.filter(pk=property_id).values_list("landlord_id", flat=True).first()
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def property_changed(sender, instance, **kwargs):
+    invalidate_landlord_dashboard(instance.landlord_id)
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def property_child_changed(sender, instance, **kwargs):
+    invalidate_landlord_dashboard(_landlord_of(instance.property_id))
+
+
+# =========================
+# BOOTSTRAP REFERENCE DATA
+# =========================
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def reference_data_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_bootstrap_version)
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def geography_changed(sender, instance, **kwargs):
+    # the geocoder's name -> id maps (core/geo.py)
+    transaction.on_commit(forget_region_ids)
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def facility_changed(sender, instance, **kwargs):
+    # drops the in-memory facility registry (core/facilities.py)
+    transaction.on_commit(bump_facility_version)
+
+
+# =========================
+# CONVERSATIONS (inbox)
+# =========================
+@receiver(post_save, sender=Message)
+def conversation_message_saved(sender, instance, created, **kwargs):
+    if created:
+        record_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def conversation_message_deleted(sender, instance, **kwargs):
+    forget_message(instance)
+
+
+# =========================
+# SERVER PUSH (core/events.py)
+# =========================
+@receiver(post_save, sender=Message)
+def push_message(sender, instance, created, **kwargs):
+    if created:
+        users = [instance.receiver_id, instance.sender_id]
+        transaction.on_commit(lambda: publish_event(
+            users, "message", id=instance.pk, sender=instance.sender_id, receiver=instance.receiver_id,
+        ))
+
+
+@receiver(post_save, sender=Application)
+def push_application(sender, instance, created, **kwargs):
+    # landlords hear about new applications, renters about status changes
+    users = [instance.property.landlord_id] if created else [instance.renter_id]
+    transaction.on_commit(lambda: publish_event(
+        users, "application", id=instance.pk, property=instance.property_id, status=instance.status,
+    ))
+
+
+# =========================
+# SLOW QUERY LOG (core/slowqueries.py)
+# =========================
+@receiver(connection_created)
+def slow_query_log(sender, connection, **kwargs):
+    install_slow_query_wrapper(connection)
@@ -0,0 +1,292 @@
+# core/slowqueries.py
+"""
+Slow-query log.
+
+Every database connection gets an execute wrapper (installed on
+connection_created, see signals.py) that times its queries. A query slower
+than SLOW_QUERY_MS is appended as one JSON line to SLOW_QUERY_LOG. Every
+worker process appends to the same file, one write per line, and none of
+them rotates it; `manage.py slowqueries --rotate` (run it from cron, or
+use logrotate) moves it aside and each handler reopens the path on its
+next line. Once the file reaches SLOW_QUERY_LOG_MAX_BYTES new samples are
+dropped until it is rotated, so a missed rotation cannot fill the disk.
+Each line holds:
+
+- the normalized SQL and its fingerprint (literals, placeholders and IN
+  lists folded, so every run of the same query shares one fingerprint);
+- the view being served (from core/instrumentation.py) and the innermost
+  project frame that ran the query;
+- the plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere), taken at most
+  once per fingerprint every SLOW_QUERY_EXPLAIN_SECONDS.
+
+Parameters are never written. `manage.py slowqueries` ranks the log.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from logging.handlers import WatchedFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+from .instrumentation import current_metrics
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """
+    SQL with literals and placeholders as `?` and lists folded to `(...)`.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip()
+    sql = _ROWS.sub(r"\1, ...", sql)  # multi-row VALUES
+    return _IN_LIST.sub("(...)", sql)
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+# ---------------- capture ----------------
+# this module and the middleware every request passes through say nothing about the query
+_SKIP_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ("slowqueries.py", "instrumentation.py", "db_routers.py")
+}
+
+
+def _caller():
+    """
+    "path/to/file.py:123 in func" for the innermost frame of project code.
+    """
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(base) and filename not in _SKIP_FILES and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+_explained = {}  # fingerprint -> monotonic time of the last EXPLAIN
+_explain_lock = threading.Lock()
+
+
+def _explain(connection, sql, params):
+    if sql.lstrip().split(None, 1)[0].upper() not in ("SELECT", "WITH"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    # a failed statement aborts an open transaction on PostgreSQL: fence it in a savepoint
+    savepoint = connection.vendor != "sqlite" and connection.in_atomic_block
+    sid = f"explain_{threading.get_ident()}"
+    try:
+        # a backend cursor: bypasses the execute wrappers (and query counts)
+        cursor = connection.create_cursor()
+        try:
+            if savepoint:
+                cursor.execute(connection.ops.savepoint_create_sql(sid))
+            try:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+            finally:
+                if savepoint:
+                    cursor.execute(connection.ops.savepoint_rollback_sql(sid))
+                    cursor.execute(connection.ops.savepoint_commit_sql(sid))
+        finally:
+            cursor.close()
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+    if connection.vendor == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(col) for col in row) for row in rows]
+
+
+def _should_explain(fp):
+    interval = getattr(settings, "SLOW_QUERY_EXPLAIN_SECONDS", 300)
+    now = time.monotonic()
+    with _explain_lock:
+        last = _explained.get(fp)
+        if last is not None and now - last < interval:
+            return False
+        _explained[fp] = now
+    return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = settings.SLOW_QUERY_LOG
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # append mode: each line goes out in one write, so processes do not interleave
+                handler = WatchedFileHandler(path, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                _store = handler
+    return _store
+
+
+_dropping = False
+
+
+def _log_full(path):
+    global _dropping
+    limit = getattr(settings, "SLOW_QUERY_LOG_MAX_BYTES", 0)
+    try:
+        full = limit > 0 and os.path.getsize(path) >= limit
+    except OSError:
+        full = False
+    if full and not _dropping:
+        logger.warning("slow-query log %s is over %d bytes; dropping samples until it is rotated", path, limit)
+    _dropping = full
+    return full
+
+
+def record(connection, sql, params, many, duration_ms):
+    if _log_full(settings.SLOW_QUERY_LOG):
+        return
+    normalized = normalize(sql)
+    fp = fingerprint(normalized)
+    metrics = current_metrics()
+    sample = {
+        "ts": timezone.now().isoformat(),
+        "ms": round(duration_ms, 2),
+        "fingerprint": fp,
+        "sql": normalized[:4000],
+        "alias": connection.alias,
+        "vendor": connection.vendor,
+        "many": many,
+        "view": getattr(metrics, "view", None),
+        "caller": _caller(),
+        "plan": _explain(connection, sql, params) if not many and _should_explain(fp) else None,
+    }
+    _get_store().handle(logging.makeLogRecord({"msg": json.dumps(sample, default=str), "levelno": logging.INFO}))
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS:
+        try:
+            record(context["connection"], sql, params, many, duration_ms)
+        except Exception:
+            logger.warning("could not record a slow query", exc_info=True)
+    return result
+
+
+def install_wrapper(connection):
+    """
+    Add the wrapper to `connection` once. It goes first in the list: the
+    execute_wrapper() context manager pops the last entry on exit, and
+    connection_created can fire inside such a block.
+    """
+    if getattr(settings, "SLOW_QUERY_MS", 0) > 0 and slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+def rotate(path=None, keep=None):
+    """
+    Move the log to path.1, compress the previous path.1 to path.2.gz and
+    shift older files up, keeping `keep` rotated files (SLOW_QUERY_LOG_KEEP).
+    Safe while workers write: a worker still holding the old file finishes
+    its line into path.1 and reopens the path on the next one, which is
+    also why path.1 is only compressed a rotation later.
+    """
+    path = path or settings.SLOW_QUERY_LOG
+    keep = getattr(settings, "SLOW_QUERY_LOG_KEEP", 5) if keep is None else keep
+    if not os.path.exists(path):
+        return False
+    for old in glob.glob(glob.escape(path) + ".*.gz"):
+        n = old[len(path) + 1:-3]
+        if n.isdigit() and int(n) >= keep:
+            os.remove(old)
+    for n in range(keep - 1, 1, -1):
+        if os.path.exists(f"{path}.{n}.gz"):
+            os.replace(f"{path}.{n}.gz", f"{path}.{n + 1}.gz")
+    if os.path.exists(f"{path}.1"):
+        if keep >= 2:
+            with open(f"{path}.1", "rb") as src, gzip.open(f"{path}.2.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            shutil.copystat(f"{path}.1", f"{path}.2.gz")  # log_files() orders by mtime
+        os.remove(f"{path}.1")
+    if keep >= 1:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+    return True
+
+
+# ---------------- analysis ----------------
+def log_files(path=None):
+    """
+    The log and the files it was rotated to (path.1, path.2.gz, ...), oldest first.
+    """
+    path = path or settings.SLOW_QUERY_LOG
+    return sorted(glob.glob(glob.escape(path) + "*"), key=os.path.getmtime)
+
+
+def read_samples(paths, since=None):
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                if since is None or sample.get("ts", "") >= since:
+                    yield sample
+
+
+def summarize(samples):
+    """
+    Per fingerprint: count, total/max ms, views, callers, SQL and the latest plan.
+    """
+    groups = {}
+    for s in samples:
+        g = groups.get(s["fingerprint"])
+        if g is None:
+            g = groups[s["fingerprint"]] = {
+                "fingerprint": s["fingerprint"], "sql": s["sql"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "views": {}, "callers": {}, "plan": None, "last_seen": "",
+            }
+        g["count"] += 1
+        g["total_ms"] += s["ms"]
+        g["max_ms"] = max(g["max_ms"], s["ms"])
+        for key, value in (("views", s.get("view")), ("callers", s.get("caller"))):
+            if value:
+                g[key][value] = g[key].get(value, 0) + 1
+        if s.get("plan"):
+            g["plan"] = s["plan"]
+        g["last_seen"] = max(g["last_seen"], s.get("ts", ""))
+    for g in groups.values():
+        g["mean_ms"] = g["total_ms"] / g["count"]
+        g["full_scan"] = bool(g["plan"]) and any(
+            line.startswith("SCAN") or "Seq Scan" in line for line in g["plan"]
+        )
+    return list(groups.values())
@@ -0,0 +1,35 @@
+# core/tasks.py
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("background task %s failed", getattr(func, "__name__", func))
+    finally:
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) on a daemon thread once the current transaction
+    commits, so the request that scheduled it returns immediately. Work that
+    must survive a restart records its state in the DB and has a management
+    command to resume it.
+
+    With settings.BACKGROUND_TASKS_INLINE the call runs synchronously (tests).
+    """
+    def start():
+        if getattr(settings, "BACKGROUND_TASKS_INLINE", False):
+            func(*args, **kwargs)
+            return
+        threading.Thread(target=_run, args=(func, args, kwargs), daemon=True).start()
+
+    transaction.on_commit(start)
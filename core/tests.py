@@ -1,3 +1,868 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core import mail as outbox
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import caching, db_routers, events, facilities, geo, instrumentation, slowqueries, throttling
+from .authentication import user_cache
+from .deletion import delete_account, request_account_deletion
+from .mail import queue_mail, send_queued_mail
+from .search import search_messages
+from .serializers import CustomTokenObtainPairSerializer
+from .models import (
+    AccountDeletion, Application, Conversation, Facility, Message, Notification, OutboundEmail, PasswordResetOTP,
+    Property, PropertyImage, Region, District, UnreadCounter, User, UserNotification, fan_out_notification,
+    get_unread_counts, mark_notifications_read,
+)
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# throttle buckets from earlier runs must not leak into this one; views over budget fail
+_run_settings = override_settings(
+    THROTTLE_STORE_PATH=os.path.join(MEDIA_ROOT, 'throttle.sqlite3'), QUERY_BUDGET_RAISE=True,
+)
+
+
+def setUpModule():
+    _run_settings.enable()
+
+
+def tearDownModule():
+    _run_settings.disable()
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(BACKGROUND_TASKS_INLINE=True, MEDIA_ROOT=MEDIA_ROOT)
+class ApplicationListQueryCountTests(TestCase):
+    """
+    Listing applications must cost the same number of queries for 1 row
+    as for many: one for the page, one for the images.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.landlord = User.objects.create_user('landlord', role='landlord')
+        region = Region.objects.create(name='Arusha', slug='arusha')
+        cls.district = District.objects.create(region=region, name='Meru')
+        cls.region = region
+        cls.renters = [User.objects.create_user(f'renter{i}') for i in range(20)]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _make_applications(self, count):
+        for i in range(count):
+            prop = Property.objects.create(
+                landlord=self.landlord, title=f'House {i}', region=self.region, district=self.district,
+                monthly_rent=100,
+            )
+            PropertyImage.objects.create(
+                property=prop, image=SimpleUploadedFile(f'img{i}.webp', b'not-an-image', content_type='image/webp'),
+            )
+            Application.objects.create(property=prop, renter=self.renters[i])
+
+    def _list(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/applications/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_landlord_query_count_is_constant(self):
+        self._make_applications(1)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._list(self.landlord)), 1)
+
+        self._make_applications(15)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._list(self.landlord)), 16)
+
+    def test_renter_query_count_is_constant(self):
+        self._make_applications(3)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self._list(self.renters[0])), 1)
+
+    def test_compact_representation(self):
+        self._make_applications(1)
+        row = self._list(self.landlord)[0]
+        self.assertEqual(set(row), {'id', 'property', 'renter', 'message', 'status', 'created_at'})
+        self.assertEqual(row['property']['region'], 'Arusha')
+        self.assertEqual(row['property']['district'], 'Meru')
+        self.assertTrue(row['property']['cover'].startswith('https://testserver/media/properties/'))
+        self.assertEqual(row['renter']['username'], 'renter0')
+        self.assertNotIn('images', row['property'])
+        self.assertNotIn('landlord', row['property'])
+
+    def test_property_without_region_or_images(self):
+        prop = Property.objects.create(landlord=self.landlord, title='Plot', monthly_rent=50)
+        Application.objects.create(property=prop, renter=self.renters[0])
+        row = self._list(self.landlord)[0]
+        self.assertIsNone(row['property']['region'])
+        self.assertIsNone(row['property']['cover'])
+
+
+class LoadRegionsTests(TestCase):
+    """
+    load_tz_regions over rows entered by hand before the bundled dataset existed.
+    """
+
+    def test_rerun_over_upper_case_rows(self):
+        arusha = Region.objects.create(name='ARUSHA', slug='arusha')
+        moshi = Region.objects.create(name='KILIMANJARO', slug='kili')  # a slug of its own
+        hai = District.objects.create(region=moshi, name='HAI')
+
+        for _ in range(2):
+            call_command('load_tz_regions', stdout=StringIO())
+
+        self.assertEqual(Region.objects.count(), 31)
+        arusha.refresh_from_db()
+        moshi.refresh_from_db()
+        self.assertEqual((arusha.name, arusha.slug), ('Arusha', 'arusha'))
+        self.assertEqual((moshi.name, moshi.slug), ('Kilimanjaro', 'kili'))
+        hai.refresh_from_db()
+        self.assertEqual(hai.name, 'Hai')
+        self.assertEqual(District.objects.filter(region=moshi, name__iexact='hai').count(), 1)
+        self.assertEqual(District.objects.count(), 195)
+
+
+class FacilityRegistryTests(TestCase):
+    """
+    Changes made by another worker never bump this process's cache version;
+    bulk_create (no signals) stands in for them.
+    """
+
+    def setUp(self):
+        Facility.objects.create(key='wifi', name='Wi-Fi')
+        facilities._registry = None
+        self.registry = facilities.get_registry()
+
+    def test_new_facility_resolves_after_a_miss(self):
+        Facility.objects.bulk_create([Facility(key='sauna', name='Sauna')])
+        self.registry.loaded_at -= facilities.MISS_RELOAD_SECONDS + 1
+        sauna = Facility.objects.get(key='sauna')
+        self.assertEqual(facilities.resolve_facilities('wifi,Sauna'), [Facility.objects.get(key='wifi').pk, sauna.pk])
+
+    def test_unknown_input_still_rejected(self):
+        self.registry.loaded_at -= facilities.MISS_RELOAD_SECONDS + 1
+        with self.assertRaisesMessage(ValidationError, 'Unknown facilities: jacuzzi'):
+            facilities.resolve_facilities(['jacuzzi'])
+
+    @override_settings(FACILITY_REGISTRY_TTL=30)
+    def test_rename_shows_after_ttl(self):
+        Facility.objects.filter(key='wifi').update(name='Wireless internet')
+        self.assertIsNone(facilities.get_registry().by_name.get('wirelessinternet'))
+        self.registry.loaded_at -= 31
+        self.assertIsNotNone(facilities.get_registry().by_name.get('wirelessinternet'))
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/bootstrap/', secure=True, **headers)
+
+    def test_unchanged_data_is_not_modified(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self._get(first['ETag']).status_code, 304)
+
+    def test_region_and_facility_changes_reach_clients(self):
+        etag = self._get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Region.objects.create(name='Dodoma', slug='dodoma')
+        response = self._get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['name'] for r in json.loads(response.content)['regions']], ['Dodoma'])
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Facility.objects.create(key='pool', name='Pool')
+        response = self._get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('pool', [f['key'] for f in json.loads(response.content)['facilities']])
+
+
+class ReplicaStickinessTests(TestCase):
+    """
+    A write must keep the client on the primary on any worker, and across a
+    token refresh; clearing the cache stands in for another worker.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer')
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def _request(self, method='get', token=None, cookies=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        request = getattr(self.factory, method)('/api/properties/', **extra)
+        request.COOKIES.update(cookies or {})
+        return request
+
+    def test_cookie_carries_across_workers(self):
+        response = HttpResponse()
+        db_routers.mark_recent_write(self._request('post'), response)
+        cookie = response.cookies['db_primary_until']
+        cache.clear()
+        self.assertTrue(db_routers.wrote_recently(self._request(cookies={cookie.key: cookie.value})))
+        self.assertFalse(db_routers.wrote_recently(self._request()))
+
+    def test_refreshed_token_keeps_the_user_on_the_primary(self):
+        db_routers.mark_recent_write(self._request('post', AccessToken.for_user(self.user)), HttpResponse())
+        self.assertTrue(db_routers.wrote_recently(self._request(token=AccessToken.for_user(self.user))))
+        other = User.objects.create_user('reader')
+        self.assertFalse(db_routers.wrote_recently(self._request(token=AccessToken.for_user(other))))
+
+    def test_expired_cookie_is_ignored(self):
+        self.assertFalse(db_routers.wrote_recently(self._request(cookies={'db_primary_until': '1'})))
+        self.assertFalse(db_routers.wrote_recently(self._request(cookies={'db_primary_until': 'junk'})))
+
+
+@override_settings(BACKGROUND_TASKS_INLINE=True)
+class NotificationFanOutTests(TestCase):
+    """
+    Fan-out writes one feed row per recipient and bumps each badge once,
+    however often it runs and whichever edit triggers it.
+    """
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}') for i in range(3)]
+        for user in self.users:
+            get_unread_counts(user)  # counters exist, so fan-out bumps them
+
+    def _counts(self):
+        return dict(UnreadCounter.objects.values_list('user_id', 'notifications'))
+
+    def _create(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(title='Hi', message='...', **fields)
+
+    def test_rerun_is_idempotent(self):
+        notification = self._create()
+        self.assertEqual(UserNotification.objects.filter(notification=notification).count(), 3)
+        self.assertEqual(set(self._counts().values()), {1})
+
+        Notification.objects.filter(pk=notification.pk).update(fanout_status='pending')
+        self.assertEqual(fan_out_notification(notification.pk), 3)
+        self.assertEqual(UserNotification.objects.filter(notification=notification).count(), 3)
+        self.assertEqual(set(self._counts().values()), {1})
+        notification.refresh_from_db()
+        self.assertEqual((notification.fanout_status, notification.fanout_count), ('done', 3))
+
+    def test_added_target_users_are_delivered(self):
+        notification = self._create(send_to_all=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.target_users.add(self.users[0])
+        self.assertEqual(list(UserNotification.objects.values_list('user_id', flat=True)), [self.users[0].pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.target_users.add(self.users[1])
+        self.assertEqual(UserNotification.objects.count(), 2)
+        self.assertEqual(self._counts(), {self.users[0].pk: 1, self.users[1].pk: 1, self.users[2].pk: 0})
+
+    def test_switching_to_send_to_all_reaches_everyone(self):
+        notification = self._create(send_to_all=False)
+        notification.send_to_all = True
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save()
+        self.assertEqual(UserNotification.objects.count(), 3)
+        self.assertEqual(set(self._counts().values()), {1})
+
+    def test_unchanged_admin_save_does_nothing(self):
+        notification = self._create(send_to_all=False, target_role='landlord')
+        notification.title = 'Edited'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(2):  # stored audience fields, the UPDATE
+                notification.save()
+        self.assertEqual(callbacks, [])
+
+    def test_deactivating_refreshes_recipients_only(self):
+        notification = self._create(send_to_all=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.target_users.add(self.users[0])
+        UnreadCounter.objects.filter(user=self.users[1]).update(notifications=7)  # out of sync on purpose
+        notification.is_active = False
+        notification.save()
+        self.assertEqual(self._counts(), {self.users[0].pk: 0, self.users[1].pk: 7, self.users[2].pk: 0})
+
+    def test_new_user_gets_earlier_broadcasts(self):
+        broadcast = self._create()
+        self._create(send_to_all=False, target_role='landlord')
+        with self.captureOnCommitCallbacks(execute=True):
+            renter = User.objects.create_user('late')
+        feed = UserNotification.objects.filter(user=renter)
+        self.assertEqual(list(feed.values_list('notification_id', flat=True)), [broadcast.pk])
+        self.assertEqual(feed.get().created_at, broadcast.created_at)
+        self.assertEqual(get_unread_counts(renter), (1, 0))
+
+    def test_delete_refreshes_recipients_in_bulk(self):
+        notification = self._create()
+        self._create()
+        mark_notifications_read(self.users[0], notification)
+        # pre_delete lookup, cascade DELETEs, the notification row, one counter UPDATE
+        with self.assertNumQueries(6):
+            notification.delete()
+        self.assertFalse(UserNotification.objects.filter(notification=notification.pk).exists())
+        self.assertEqual(set(self._counts().values()), {1})
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.me, self.alice, self.bob = (User.objects.create_user(name) for name in ('me', 'alice', 'bob'))
+        get_unread_counts(self.me)  # a badge counter to move
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.minutes = 0
+
+    def _send(self, sender, receiver, text='hi'):
+        self.minutes += 1
+        at = timezone.now() + timezone.timedelta(minutes=self.minutes)
+        with mock.patch('django.utils.timezone.now', return_value=at):
+            return Message.objects.create(sender=sender, receiver=receiver, text=text)
+
+    def _inbox(self):
+        rows = self.client.get('/api/conversations/', secure=True).json()
+        return [(row['peer']['id'], row['last_message']['text'], row['unread_count']) for row in rows]
+
+    def test_inbox_is_newest_thread_first(self):
+        self._send(self.alice, self.me, 'a1')
+        self._send(self.me, self.bob, 'b1')
+        self.assertEqual(self._inbox(), [(self.bob.pk, 'b1', 0), (self.alice.pk, 'a1', 1)])
+        self._send(self.alice, self.me, 'a2')
+        self.assertEqual(self._inbox(), [(self.alice.pk, 'a2', 2), (self.bob.pk, 'b1', 0)])
+
+    def test_thread_pages_newest_first(self):
+        sent = [self._send(self.alice if i % 2 else self.me, self.me if i % 2 else self.alice) for i in range(5)]
+        sent.append(self._send(self.bob, self.me))  # another thread
+        url, seen = f'/api/conversations/{self.alice.pk}/messages/?page_size=2', []
+        while url:
+            page = self.client.get(url, secure=True).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [m.pk for m in reversed(sent[:5])])
+
+    def test_read_clears_thread_and_badge(self):
+        first = self._send(self.alice, self.me)
+        self._send(self.alice, self.me)
+        self._send(self.bob, self.me)
+        self.assertEqual(get_unread_counts(self.me), (0, 3))
+
+        response = self.client.post(f'/api/conversations/{self.alice.pk}/read/', {'up_to': first.pk}, secure=True)
+        self.assertEqual(response.json(), {'marked': 1, 'unread_count': 1})
+        response = self.client.post(f'/api/conversations/{self.alice.pk}/read/', secure=True)
+        self.assertEqual(response.json(), {'marked': 1, 'unread_count': 0})
+        self.assertEqual(get_unread_counts(self.me), (0, 1))
+
+    def test_deleting_the_last_message_repoints_the_thread(self):
+        self._send(self.me, self.alice, 'older')
+        latest = self._send(self.alice, self.me, 'newer')
+        latest.delete()
+        self.assertEqual(self._inbox(), [(self.alice.pk, 'older', 0)])
+        self.assertEqual(get_unread_counts(self.me), (0, 0))
+        alice_view = Conversation.objects.get(owner=self.alice, peer=self.me)
+        self.assertEqual(alice_view.last_message.text, 'older')
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('listener')
+        self.sent = []
+        self.gone = asyncio.Event()
+
+    async def _receive(self):
+        await self.gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def _send(self, message):
+        self.sent.append(message)
+
+    async def _until(self, condition):
+        async def poll():
+            while not condition():
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(poll(), 5)
+
+    def _body(self):
+        return b''.join(m.get('body', b'') for m in self.sent if m['type'] == 'http.response.body').decode()
+
+    async def _connect(self, token):
+        from rental_project.asgi import application
+
+        scope = {'type': 'http', 'path': settings.EVENTS_PATH, 'headers': [], 'query_string': f'token={token}'.encode()}
+        await application(scope, self._receive, self._send)
+
+    async def test_invalid_or_expired_token_is_refused(self):
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=-timezone.timedelta(seconds=1))
+        for token in ('not-a-token', expired):
+            self.sent.clear()
+            await self._connect(token)
+            self.assertEqual(self.sent[0]['status'], 401)
+
+    async def test_published_event_reaches_the_subscriber(self):
+        stream = asyncio.ensure_future(self._connect(AccessToken.for_user(self.user)))
+        await self._until(events.broker.connection_count)
+        events.publish_event([self.user.pk], 'message', id=7)
+        await self._until(lambda: 'event: message' in self._body())
+        self.gone.set()
+        await stream
+        self.assertEqual(self.sent[0]['status'], 200)
+        self.assertIn('"id": 7', self._body())
+        self.assertEqual(events.broker.connection_count(), 0)
+
+    async def test_stream_ends_when_the_token_expires(self):
+        await asyncio.wait_for(
+            events.stream_events(self.user.pk, self._receive, self._send, expires_at=time.time() + 0.05), 5,
+        )
+        self.assertTrue(self._body().endswith('event: expired\ndata: {}\n\n'))
+        self.assertFalse(self.sent[-1].get('more_body'))
+
+
+class MessageSearchTests(TestCase):
+    def test_snippet_escapes_message_text(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        Message.objects.create(sender=alice, receiver=bob, text='rent <img src=x onerror=alert(1)> is due')
+        rows, _ = search_messages(bob, 'rent')
+        self.assertEqual(rows[0]['snippet'], '<mark>rent</mark> &lt;img src=x onerror=alert(1)&gt; is due')
+
+
+class ResolveUserTests(TestCase):
+    def test_username_wins_over_many_email_matches(self):
+        for i in range(12):
+            User.objects.create_user(f'shared{i}', email='ops@example.com')
+        owner = User.objects.create_user('ops@example.com')
+        with self.assertNumQueries(1):
+            self.assertEqual(CustomTokenObtainPairSerializer.resolve_user('ops@example.com'), owner)
+        self.assertEqual(CustomTokenObtainPairSerializer.resolve_user('0700000000'), None)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('cached')
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_deactivation_elsewhere_is_seen_on_the_next_request(self):
+        self.assertEqual(self.client.get('/api/badges/', secure=True).status_code, 200)
+        # another worker deactivates the user: our copy is stale, only the shared version moved
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/badges/', secure=True).status_code, 200)
+        caching.bump_user_versions(self.user.pk)
+        self.assertEqual(self.client.get('/api/badges/', secure=True).status_code, 401)
+
+
+class SlowQueryLogTests(TestCase):
+    def test_reads_files_rotated_outside_the_app(self):
+        path = os.path.join(MEDIA_ROOT, 'slow.jsonl')
+        with gzip.open(f'{path}.2.gz', 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'ts': '2026-01-01', 'fingerprint': 'a', 'sql': 'SELECT ?', 'ms': 300}) + '\n')
+        os.utime(f'{path}.2.gz', (0, 0))
+        with self.settings(SLOW_QUERY_LOG=path):
+            slowqueries._store = None
+            slowqueries.record(connection, 'SELECT id FROM core_user WHERE id = %s', [1], False, 250.0)
+        slowqueries._store.close()
+        slowqueries._store = None
+
+        self.assertEqual(slowqueries.log_files(path), [f'{path}.2.gz', path])
+        groups = {g['fingerprint']: g for g in slowqueries.summarize(slowqueries.read_samples(slowqueries.log_files(path)))}
+        self.assertEqual(len(groups), 2)
+        recorded = next(g for fp, g in groups.items() if fp != 'a')
+        self.assertEqual(recorded['sql'], 'SELECT id FROM core_user WHERE id = ?')
+        self.assertTrue(recorded['plan'])
+
+    def test_rotation_keeps_a_bounded_history(self):
+        path = os.path.join(MEDIA_ROOT, 'rotated.jsonl')
+
+        def record():
+            slowqueries.record(connection, 'SELECT 1', [], True, 250.0)
+
+        with self.settings(SLOW_QUERY_LOG=path, SLOW_QUERY_LOG_MAX_BYTES=1, SLOW_QUERY_LOG_KEEP=2):
+            slowqueries._store = None
+            record()
+            record()  # the first line filled the log
+            self.assertEqual(len(list(slowqueries.read_samples([path]))), 1)
+            for _ in range(3):
+                call_command('slowqueries', rotate=True, stdout=StringIO())
+                record()
+        slowqueries._store.close()
+        slowqueries._store = None
+
+        # the first file went on the third rotation
+        self.assertEqual(slowqueries.log_files(path), [f'{path}.2.gz', f'{path}.1', path])
+        self.assertEqual(len(list(slowqueries.read_samples(slowqueries.log_files(path)))), 3)
+
+
+class GeocoderTests(TestCase):
+    def setUp(self):
+        self.geocoder = geo.TownGeocoder.from_file(settings.GEO_TOWNS_PATH)
+
+    def test_bundled_towns_place_points_in_regions(self):
+        self.assertEqual(self.geocoder.names(-3.38, 36.70), ('Arusha', None))
+        self.assertEqual(self.geocoder.names(-6.16, 39.20), ('Mjini Magharibi', None))
+        self.assertEqual(self.geocoder.names(-1.29, 36.82), (None, None))  # Nairobi
+
+    def test_unmatched_region_reloads_at_most_once_per_interval(self):
+        Region.objects.create(name='Arusha', slug='arusha')
+        with self.assertNumQueries(2):
+            self.geocoder.resolve(-3.38, 36.70)
+            for _ in range(3):
+                self.assertEqual(self.geocoder.resolve(-2.52, 32.90), (None, None))  # no Mwanza row
+        mwanza = Region.objects.create(name='Mwanza', slug='mwanza')
+        self.geocoder._loaded_at -= self.geocoder.MISS_RELOAD_SECONDS
+        self.assertEqual(self.geocoder.resolve(-2.52, 32.90), (mwanza.pk, None))
+
+    def test_town_guesses_yield_to_boundaries(self):
+        arusha = Region.objects.create(name='Arusha', slug='arusha')
+        meru = Region.objects.create(name='Meru', slug='meru')
+        landlord = User.objects.create_user('lister', role='landlord')
+        with mock.patch.object(geo, '_geocoder', self.geocoder), mock.patch.object(geo, '_loaded', True):
+            guessed = Property.objects.create(landlord=landlord, title='Guessed', lat=-3.38, lng=36.70)
+            chosen = Property.objects.create(landlord=landlord, title='Chosen', lat=-3.38, lng=36.70, region=arusha)
+        self.assertEqual((guessed.region_id, guessed.region_source), (arusha.pk, 'towns'))
+
+        path = os.path.join(MEDIA_ROOT, 'boundaries.geojson')
+        square = [[36.6, -3.5], [36.8, -3.5], [36.8, -3.3], [36.6, -3.3]]
+        with open(path, 'w') as f:
+            json.dump({'features': [
+                {'properties': {'region': 'Meru'}, 'geometry': {'type': 'Polygon', 'coordinates': [square]}},
+            ]}, f)
+        call_command('geocode_properties', boundaries=path, stdout=StringIO())
+        guessed.refresh_from_db()
+        chosen.refresh_from_db()
+        self.assertEqual((guessed.region_id, guessed.region_source), (meru.pk, 'boundaries'))
+        self.assertEqual((chosen.region_id, chosen.region_source), (arusha.pk, ''))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_QUEUE_KICK=False)
+class OutboundEmailTests(TestCase):
+    def test_sent_body_is_blanked_and_old_rows_purged(self):
+        email = queue_mail('Your password reset code', 'Your password reset code is: 123456', ['a@example.com'])
+        self.assertEqual(send_queued_mail()['sent'], 1)
+        self.assertEqual(outbox.outbox[0].body, 'Your password reset code is: 123456')
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body), ('sent', ''))
+
+        queued = queue_mail('Later', 'not sent yet', ['b@example.com'])
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timezone.timedelta(days=8))
+        call_command('send_queued_email', purge=True, stdout=StringIO())
+        self.assertEqual(list(OutboundEmail.objects.values_list('pk', flat=True)), [queued.pk])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PasswordResetOTPTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('forgetful', email='f@example.com', password='old-pass')
+        self.client = APIClient()
+
+    def _reset(self, code, password='n3w-Passw0rd'):
+        return self.client.post('/api/auth/reset-password/', {
+            'email': 'f@example.com', 'code': code, 'new_password': password,
+        }, format='json', secure=True)
+
+    def test_expired_code_is_rejected(self):
+        otp = PasswordResetOTP.objects.create(user=self.user, code='123456')
+        PasswordResetOTP.objects.filter(pk=otp.pk).update(created_at=timezone.now() - PasswordResetOTP.LIFETIME)
+        response = self._reset('123456')
+        self.assertEqual((response.status_code, response.json()['detail']), (400, 'Code expired'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('old-pass'))
+
+    def test_code_works_once(self):
+        otp = PasswordResetOTP.objects.create(user=self.user, code='654321')
+        self.assertEqual(self._reset('654321').status_code, 200)
+        self.assertEqual(self._reset('654321', 'an0ther-Passw0rd').status_code, 400)
+        self.assertFalse(otp.consume())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('n3w-Passw0rd'))
+
+    def test_purge_deletes_in_batches(self):
+        PasswordResetOTP.objects.bulk_create(
+            [PasswordResetOTP(user=self.user, code=f'{i:06}') for i in range(5)]
+            + [PasswordResetOTP(user=self.user, code=f'{i:06}', is_used=True) for i in range(5, 7)]
+        )
+        PasswordResetOTP.objects.filter(is_used=False).update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        fresh = PasswordResetOTP.objects.create(user=self.user, code='999999')
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_password_reset_otps', batch_size=2, stdout=StringIO())
+        deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 4)  # 2 + 2 + 1 expired, then the 2 used
+        self.assertEqual(list(PasswordResetOTP.objects.values_list('pk', flat=True)), [fresh.pk])
+
+
+@override_settings(BACKGROUND_TASKS_INLINE=True)
+class BulkApplicationStatusTests(TestCase):
+    """
+    One request accepts a renter and rejects the property's other pending
+    applications; each renter hears about their own outcome.
+    """
+
+    def setUp(self):
+        self.landlord = User.objects.create_user('owner', role='landlord')
+        region = Region.objects.create(name='Arusha', slug='arusha')
+        district = District.objects.create(region=region, name='Meru')
+        self.prop = Property.objects.create(
+            landlord=self.landlord, title='Villa', region=region, district=district, monthly_rent=100,
+        )
+        self.renters = [User.objects.create_user(f'renter{i}') for i in range(3)]
+        self.apps = [Application.objects.create(property=self.prop, renter=r) for r in self.renters]
+        other = Property.objects.create(
+            landlord=User.objects.create_user('rival', role='landlord'), title='Hut', region=region, district=district,
+            monthly_rent=50,
+        )
+        self.foreign = Application.objects.create(property=other, renter=self.renters[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.landlord)
+
+    def _post(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/applications/bulk-status/', data, format='json', secure=True)
+
+    def test_accept_one_reject_the_rest(self):
+        Application.objects.filter(pk=self.apps[2].pk).update(status='rejected')
+        response = self._post({
+            'updates': [{'id': self.apps[0].pk, 'status': 'accepted'}, {'id': self.foreign.pk, 'status': 'accepted'}],
+            'reject_others_for_property': self.prop.pk,
+            'notify': True,
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            sorted((row['id'], row['status']) for row in body['updated']),
+            [(self.apps[0].pk, 'accepted'), (self.apps[1].pk, 'rejected')],
+        )
+        self.assertEqual(body['not_found'], [self.foreign.pk])
+        self.assertEqual(
+            dict(Application.objects.values_list('pk', 'status')),
+            {self.apps[0].pk: 'accepted', self.apps[1].pk: 'rejected', self.apps[2].pk: 'rejected',
+             self.foreign.pk: 'pending'},
+        )
+        feed = UserNotification.objects.values_list('user_id', 'notification__title')
+        self.assertEqual(
+            sorted(feed), sorted([(self.renters[0].pk, 'Application accepted'), (self.renters[1].pk, 'Application rejected')]),
+        )
+
+    def test_repeat_changes_nothing(self):
+        data = {'updates': [{'id': self.apps[0].pk, 'status': 'accepted'}], 'notify': True}
+        self._post(data)
+        body = self._post(data).json()
+        self.assertEqual((body['updated'], body['unchanged']), ([], [self.apps[0].pk]))
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class LandlordDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.landlord = User.objects.create_user('owner', role='landlord')
+        self.prop = Property.objects.create(landlord=self.landlord, title='Villa', monthly_rent=100)
+        self.renter = User.objects.create_user('tenant')
+        self.client = APIClient()
+        self.client.force_authenticate(self.landlord)
+
+    def _totals(self):
+        response = self.client.get('/api/landlord/dashboard/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['totals']
+
+    def test_cached_per_landlord(self):
+        self.assertEqual(self._totals()['properties'], 1)
+        with self.assertNumQueries(0):
+            self._totals()
+        rival = User.objects.create_user('rival', role='landlord')
+        self.client.force_authenticate(rival)
+        self.assertEqual(self._totals()['properties'], 0)
+
+    def test_saves_and_bulk_status_invalidate(self):
+        self._totals()
+        application = Application.objects.create(property=self.prop, renter=self.renter)
+        self.assertEqual(self._totals()['applications']['pending'], 1)
+
+        self.prop.is_available = False
+        self.prop.save()
+        self.assertEqual(self._totals()['available'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/applications/bulk-status/', {
+                'updates': [{'id': application.pk, 'status': 'accepted'}],
+            }, format='json', secure=True)
+        self.assertEqual(self._totals()['applications'], {'pending': 0, 'accepted': 1, 'rejected': 0})
+
+    def test_renters_are_refused(self):
+        self.client.force_authenticate(self.renter)
+        self.assertEqual(self.client.get('/api/landlord/dashboard/', secure=True).status_code, 403)
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        self.store = throttling.TokenBucketStore(os.path.join(tempfile.mkdtemp(dir=MEDIA_ROOT), 'buckets.sqlite3'))
+        self.now = 1000.0
+        patcher = mock.patch.object(throttling.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_denial_with_retry_after(self):
+        results = [self.store.take('k', capacity=3, rate=0.5) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertAlmostEqual(results[-1][1], 2.0)  # one token at 0.5/s
+
+    def test_refill_is_capped_at_capacity(self):
+        for _ in range(3):
+            self.store.take('k', capacity=3, rate=0.5)
+        self.now += 1.0  # half a token
+        self.assertEqual(self.store.take('k', capacity=3, rate=0.5), (False, 1.0))
+        self.now += 1.0
+        self.assertEqual(self.store.take('k', capacity=3, rate=0.5), (True, 0.0))
+        self.now += 3600
+        self.assertEqual([self.store.take('k', 3, 0.5)[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(self.store.take('other', 3, 0.5), (True, 0.0))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_login_answers_429_with_retry_after(self):
+        throttling._store, saved = self.store, throttling._store
+        self.addCleanup(setattr, throttling, '_store', saved)
+        client = APIClient()
+        for _ in range(10):  # 'login': '10/min'
+            self.assertEqual(client.post('/api/auth/token/', {'username': 'x', 'password': 'y'}, secure=True).status_code, 400)
+        response = client.post('/api/auth/token/', {'username': 'x', 'password': 'y'}, secure=True)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '6')
+
+
+@override_settings(BACKGROUND_TASKS_INLINE=True, MEDIA_ROOT=MEDIA_ROOT)
+class AccountDeletionTests(TestCase):
+    """
+    The raw batched deletes must run in foreign-key order (checked with
+    check_constraints, as SQLite defers FK checks to commit) and leave
+    other users' rows alone.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('leaving', role='landlord')
+        self.peer = User.objects.create_user('peer')
+        other_landlord = User.objects.create_user('other', role='landlord')
+        region = Region.objects.create(name='Arusha', slug='arusha')
+        district = District.objects.create(region=region, name='Meru')
+        prop = Property.objects.create(landlord=self.user, title='Mine', region=region, district=district, monthly_rent=1)
+        prop.facilities.add(Facility.objects.create(key='wifi', name='Wi-Fi'))
+        self.image = PropertyImage.objects.create(
+            property=prop, image=SimpleUploadedFile('mine.webp', b'not-an-image', content_type='image/webp'),
+        )
+        self.other_prop = Property.objects.create(
+            landlord=other_landlord, title='Theirs', region=region, district=district, monthly_rent=1,
+        )
+        Application.objects.create(property=prop, renter=self.peer)
+        Application.objects.create(property=self.other_prop, renter=self.user)
+        self.kept = Application.objects.create(property=self.other_prop, renter=self.peer)
+        Message.objects.create(sender=self.user, receiver=self.peer, text='hello')
+        Message.objects.create(sender=self.peer, receiver=self.user, text='hi')
+        PasswordResetOTP.objects.create(user=self.user, code='123456')
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(title='All', message='...')
+        get_unread_counts(self.peer)
+
+    def test_user_is_deactivated_before_the_job_runs(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            deletion = request_account_deletion(self.user)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(deletion.status, 'pending')
+        self.assertTrue(Property.objects.filter(landlord=self.user).exists())
+
+    def test_deletes_everything_in_fk_order(self):
+        path = self.image.image.path
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion = request_account_deletion(self.user)
+        connection.check_constraints()
+
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.step), ('done', ''))
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertGreaterEqual(deletion.files_deleted, 1)
+        for model, lookup in (
+            (Property, 'landlord'), (Application, 'renter'), (Message, 'sender'), (Message, 'receiver'),
+            (Conversation, 'owner'), (Conversation, 'peer'), (UserNotification, 'user'), (PasswordResetOTP, 'user'),
+        ):
+            self.assertFalse(model.objects.filter(**{f'{lookup}_id': self.user.pk}).exists(), (model, lookup))
+        self.assertEqual(list(Application.objects.all()), [self.kept])
+        self.assertTrue(Property.objects.filter(pk=self.other_prop.pk).exists())
+        self.assertEqual(get_unread_counts(self.peer), (1, 0))  # the message from the deleted user is gone
+
+        # a second run is a no-op
+        self.assertEqual(delete_account(deletion.pk).rows_deleted, deletion.rows_deleted)
+        self.assertEqual(AccountDeletion.objects.count(), 1)
+
+
+class QueryBudgetTests(TestCase):
+    def test_view_over_budget_fails_the_test_run(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('counter'))
+        with mock.patch.object(instrumentation, '_view_budget', return_value=0):
+            with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                client.get('/api/badges/', secure=True)
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_tuned_sqlite_pragmas_apply(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        tuned = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': os.path.join(MEDIA_ROOT, 'tuned.sqlite3'),
+            'OPTIONS': settings.SQLITE_TUNED_OPTIONS,
+        }, alias='tuned')
+        try:
+            with tuned.cursor() as cursor:
+                pragmas = {}
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'temp_store'):
+                    pragmas[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+            self.assertEqual(tuned.transaction_mode, 'IMMEDIATE')
+        finally:
+            tuned.close()
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -20000, 'temp_store': 2,
+        })
+
+    def _postgres_settings(self, **env):
+        env = {'POSTGRES_DB': 'rentals', 'WEB_THREADS': '6', **env}
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'rental_project', 'settings.py'))['DATABASES']
+
+    def test_postgres_pools_by_default(self):
+        default = self._postgres_settings()['default']
+        self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(default['OPTIONS']['pool']['max_size'], 8)  # request threads + background tasks
+        self.assertNotIn('CONN_MAX_AGE', default)
+
+    def test_postgres_without_pool_keeps_connections(self):
+        default = self._postgres_settings(DB_POOL='False')['default']
+        self.assertNotIn('pool', default['OPTIONS'])
+        self.assertEqual((default['CONN_MAX_AGE'], default['CONN_HEALTH_CHECKS']), (60, True))
+
+
+class MigrationTests(TestCase):
+    def test_models_match_migrations(self):
+        # exits non-zero (SystemExit) when a model change has no migration
+        call_command('makemigrations', '--check', '--dry-run', stdout=StringIO())
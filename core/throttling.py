@@ -0,0 +1,193 @@
+# core/throttling.py
+"""
+DRF throttles backed by token buckets in a small SQLite file shared by
+every worker process on the host (THROTTLE_STORE_PATH).
+
+Each check is one UPSERT ... RETURNING on the bucket's primary key: the
+refill, the take and the verdict happen in a single atomic statement, so
+concurrent workers never race on read-modify-write. Rates use DRF's
+"<n>/<period>" strings from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+n is the burst size and the bucket refills n tokens per period.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# one call in PRUNE_EVERY also drops buckets that have refilled completely
+PRUNE_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# All right-hand sides see the row as it was before the update.
+_TAKE = """
+INSERT INTO bucket (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE
+        WHEN min(:capacity, tokens + (:now - updated) * :rate) >= 1
+        THEN min(:capacity, tokens + (:now - updated) * :rate) - 1
+        ELSE min(:capacity, tokens + (:now - updated) * :rate)
+    END,
+    allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+
+class TokenBucketStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate):
+        """
+        Take one token from bucket `key` (holding at most `capacity`, refilled
+        at `rate` tokens per second). Returns (allowed, retry_after_seconds).
+        """
+        now = time.time()
+        conn = self._connection()
+        tokens, allowed = conn.execute(_TAKE, {"key": key, "capacity": capacity, "rate": rate, "now": now}).fetchone()
+        if random.randrange(PRUNE_EVERY) == 0:
+            self.prune(now)
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / rate
+
+    def prune(self, now=None):
+        # a bucket idle for a full day is full again for any rate we use
+        now = now or time.time()
+        self._connection().execute("DELETE FROM bucket WHERE updated < ?", (now - 86400,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TokenBucketStore(str(settings.THROTTLE_STORE_PATH))
+    return _store
+
+
+@receiver(setting_changed)
+def _store_path_changed(setting, **kwargs):
+    global _store
+    if setting == "THROTTLE_STORE_PATH":
+        _store = None
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Base class: like SimpleRateThrottle, but a token bucket in the shared
+    store instead of a request history in the cache.
+    """
+
+    def __init__(self):
+        if not getattr(self, "rate", None):
+            self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self._wait = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        try:
+            allowed, self._wait = get_store().take(self.key, self.num_requests, self.num_requests / self.duration)
+        except sqlite3.Error:
+            # never turn a throttle-store problem into an outage
+            logger.warning("throttle store unavailable; allowing request", exc_info=True)
+            return True
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def get_cache_key(self, request, view):
+        return f"{self.scope}:{self.get_ident_key(request)}"
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class ScopedBucketThrottle(TokenBucketThrottle):
+    """
+    Applies the rate named by the view's `throttle_scope`, if any.
+    """
+    scope_attr = "throttle_scope"
+
+    def __init__(self):
+        # the rate depends on the view, so it is resolved in allow_request()
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self._wait = None
+        return super().allow_request(request, view)
+
+
+class UploadBucketThrottle(TokenBucketThrottle):
+    """
+    Limits writes on endpoints that accept image uploads; reads are free.
+    """
+    scope = "uploads"
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return super().get_cache_key(request, view)
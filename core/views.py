@@ -17,14 +17,14 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from .serializers import ChangePasswordSerializer
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 import random
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from .mail import queue_mail
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -42,16 +42,42 @@ from .serializers import (
 from .models import (
     Region, District,
     Property, PropertyImage,
-    Application, Message
+    Application, Message, Conversation, mark_thread_read, thread_messages,
+    bulk_set_application_status, notify_application_status
 )
 from .serializers import (
     RegionSerializer, DistrictSerializer,
     PropertySerializer, ApplicationSerializer, MessageSerializer,
     RegisterSerializer, UserSerializer,
-    CustomTokenObtainPairSerializer
+    CustomTokenObtainPairSerializer,
+    ConversationSerializer, ThreadMessageSerializer,
+    ApplicationBulkStatusSerializer
 )
+from rest_framework import mixins
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from django.db import transaction
+from .events import publish_event
+from .search import search_messages
+from .caching import (
+    bootstrap_cache_key, dashboard_cache_key, get_bootstrap_version, invalidate_landlord_dashboard
+)
+from django.conf import settings
+from django.core.cache import cache
+from .throttling import UploadBucketThrottle
+from .deletion import request_account_deletion
+from .facilities import get_registry as get_facility_registry
+from .instrumentation import query_budget
+import gzip
+import hashlib
+import json
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 # ================= Register View =================
@@ -78,11 +104,15 @@ class RegionListView(generics.ListAPIView):
     queryset = Region.objects.all().order_by('name')
     serializer_class = RegionSerializer
     permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+    query_budget = 2
 
 
 class DistrictListView(generics.ListAPIView):
     serializer_class = DistrictSerializer
     permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+    query_budget = 2
 
     def get_queryset(self):
         qs = District.objects.select_related('region').all().order_by('name')
@@ -102,11 +132,15 @@ class PropertyViewSet(viewsets.ModelViewSet):
       - region=<id> (filter by region)
       - district=<id> (filter by district)
     """
-    queryset = Property.objects.select_related('region', 'district', 'landlord')\
+    queryset = Property.objects.select_related('region', 'district__region', 'landlord')\
         .prefetch_related('images', 'facilities').all().order_by('-created_at')
     serializer_class = PropertySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]  # accept multipart/form-data
+    throttle_classes = [*APIView.throttle_classes, UploadBucketThrottle]
+    use_read_replica = True  # GETs only; see core/db_routers.py
+    # page + images + facilities, and the user on an auth cache miss (core/instrumentation.py)
+    query_budget = {'GET': 4}
 
     def perform_create(self, serializer):
         """
@@ -114,112 +148,10 @@ class PropertyViewSet(viewsets.ModelViewSet):
         """
         serializer.save()
 
-    def _parse_facilities_payload(self, payload):
-        """
-        Normalize incoming payload into two lists: numeric_ids (ints) and keys (strings).
-        Accepts:
-          - JSON string: "[1,2]" or '["wifi","gym"]'
-          - Python list (from parsed JSON/form parser)
-          - comma-separated string: "wifi,gym"
-        Returns: (ids_list, keys_list)
-        """
-        import json
-
-        if payload is None:
-            return ([], [])
-        fac_list = []
-        # If it's already a list/tuple-like
-        if isinstance(payload, (list, tuple)):
-            fac_list = list(payload)
-        elif isinstance(payload, str):
-            payload = payload.strip()
-            if not payload:
-                fac_list = []
-            else:
-                # try parse JSON first
-                try:
-                    parsed = json.loads(payload)
-                    if isinstance(parsed, (list, tuple)):
-                        fac_list = list(parsed)
-                    else:
-                        # something else (e.g. single string)
-                        fac_list = [parsed]
-                except Exception:
-                    # fallback: comma separated
-                    fac_list = [p.strip() for p in payload.split(",") if p.strip()]
-        else:
-            # other single scalar (int)
-            fac_list = [payload]
-
-        ids = []
-        keys = []
-        for item in fac_list:
-            if item is None:
-                continue
-            s = str(item).strip()
-            # numeric id?
-            if s.isdigit():
-                try:
-                    ids.append(int(s))
-                except Exception:
-                    pass
-            else:
-                # treat as key/name string
-                if s:
-                    keys.append(s)
-        return (ids, keys)
-
-    def _attach_facilities_to_instance(self, instance, payload):
-        """
-        Attach facilities to `instance` based on payload.
-        Payload may be JSON string, array, or comma separated keys.
-        If payload is an empty list, clear facilities.
-        """
-        try:
-            ids, keys = self._parse_facilities_payload(payload)
-
-            # If empty list explicitly passed (and nothing else), clear set
-            if isinstance(payload, (list, tuple)) and len(payload) == 0:
-                instance.facilities.clear()
-                return
-
-            if ids:
-                # attach by numeric ids
-                qs = Facility.objects.filter(id__in=ids)
-                instance.facilities.set(qs)
-            elif keys:
-                # prefer matching Facility.key first, fallback to name if needed
-                qs = Facility.objects.filter(key__in=keys)
-                if qs.exists():
-                    instance.facilities.set(qs)
-                else:
-                    # try matching by name (case-insensitive)
-                    # map incoming keys to facilities by name
-                    lower_keys = [k.lower() for k in keys]
-                    qs2 = Facility.objects.filter(name__iregex=r'(' + '|'.join([r'\b' + k + r'\b' for k in lower_keys]) + r')')
-                    if qs2.exists():
-                        instance.facilities.set(qs2)
-                    else:
-                        # nothing matched; attempt find by exact name/key individually
-                        matched = []
-                        for k in keys:
-                            f = Facility.objects.filter(models.Q(key=k) | models.Q(name__iexact=k)).first()
-                            if f:
-                                matched.append(f.id)
-                        if matched:
-                            instance.facilities.set(Facility.objects.filter(id__in=matched))
-                        else:
-                            # nothing matched, do nothing (don't clear)
-                            pass
-            # else: nothing provided or could not parse => leave as-is
-        except Exception as e:
-            # Don't fail the request if facility parsing has an error; log for debugging.
-            print("facility attach error:", e)
-
     def create(self, request, *args, **kwargs):
         """
         Override to support multipart image uploads (images[]).
-        Also accept 'facilities' (JSON string or array) or 'facility_ids' to attach Facility m2m.
+        'facilities' / 'facility_ids' are resolved by the serializer (core/facilities.py).
         """
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
@@ -232,11 +164,6 @@ class PropertyViewSet(viewsets.ModelViewSet):
         for f in files:
             PropertyImage.objects.create(property=instance, image=f)
 
-        # Accept either 'facilities' or 'facility_ids'
-        fac_payload = request.data.get('facilities', None) or request.data.get('facility_ids', None)
-        if fac_payload is not None:
-            self._attach_facilities_to_instance(instance, fac_payload)
-
         output_serializer = self.get_serializer(instance, context={'request': request})
         headers = self.get_success_headers(output_serializer.data)
         return Response(output_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -244,7 +171,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         """
         Ensure updates accept multipart images[] to append to existing images.
-        Also accept 'facilities' (JSON string or array) or 'facility_ids' to set Facility m2m.
+        'facilities' / 'facility_ids' replace the set when sent (an empty list clears it).
         """
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -257,11 +184,6 @@ class PropertyViewSet(viewsets.ModelViewSet):
         for f in files:
             PropertyImage.objects.create(property=instance, image=f)
 
-        # Update facilities if provided (note: allow clearing with empty list)
-        if 'facilities' in request.data or 'facility_ids' in request.data:
-            fac_payload = request.data.get('facilities', None) if 'facilities' in request.data else request.data.get('facility_ids', None)
-            self._attach_facilities_to_instance(instance, fac_payload)
-
         return Response(self.get_serializer(instance, context={'request': request}).data)
 
     def get_queryset(self):
@@ -286,20 +208,119 @@ class PropertyViewSet(viewsets.ModelViewSet):
 
 # ================= Application ViewSet =================
 class ApplicationViewSet(viewsets.ModelViewSet):
-    queryset = Application.objects.select_related('property', 'renter').all().order_by('-created_at')
+    """
+    Applications with a compact property/renter representation, loaded with a
+    fixed number of queries whatever the number of rows.
+    """
+    queryset = Application.objects.select_related(
+        'property__region', 'property__district', 'renter'
+    ).prefetch_related(
+        models.Prefetch('property__images', queryset=PropertyImage.objects.only('id', 'property_id', 'image', 'thumbnail', 'uploaded_at'))
+    ).order_by('-created_at')
     serializer_class = ApplicationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 3}
 
     def perform_create(self, serializer):
         serializer.save(renter=self.request.user)
 
     def get_queryset(self):
+        qs = super().get_queryset()
         user = self.request.user
         if user.role == 'landlord':
             # landlord sees applications for their properties
-            return Application.objects.filter(property__landlord=user).order_by('-created_at')
+            return qs.filter(property__landlord=user)
         # renter sees applications they created
-        return Application.objects.filter(renter=user).order_by('-created_at')
+        return qs.filter(renter=user)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        """
+        Landlord-only batch transition, e.g. accept one renter and reject the
+        rest of a property's pending applications in one request.
+        """
+        if request.user.role != 'landlord':
+            return Response({"detail": "Only landlords can change application status."}, status=status.HTTP_403_FORBIDDEN)
+        serializer = ApplicationBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        updates = {item['id']: item['status'] for item in data['updates']}
+
+        changed, unchanged, not_found = bulk_set_application_status(
+            request.user, updates, data['reject_others_for_property']
+        )
+
+        if changed:
+            invalidate_landlord_dashboard(request.user.pk)
+            for row in changed:
+                transaction.on_commit(lambda row=row: publish_event(
+                    [row['renter_id']], "application", id=row['id'], property=row['property_id'], status=row['status'],
+                ))
+            if data['notify']:
+                notify_application_status(changed)
+
+        return Response({
+            "updated": [{"id": row['id'], "status": row['status']} for row in changed],
+            "unchanged": unchanged,
+            "not_found": not_found,
+        })
+
+
+# ================= Landlord Dashboard =================
+def landlord_dashboard_data(landlord):
+    """
+    Per-property and total counts for a landlord's listings from three
+    grouped queries (properties, applications by status, images).
+    """
+    properties = list(
+        Property.objects.filter(landlord=landlord).order_by('-created_at').values('id', 'title', 'is_available')
+    )
+    applications = {
+        row['property_id']: row
+        for row in Application.objects.filter(property__landlord=landlord).values('property_id').annotate(
+            pending=models.Count('id', filter=models.Q(status='pending')),
+            accepted=models.Count('id', filter=models.Q(status='accepted')),
+            rejected=models.Count('id', filter=models.Q(status='rejected')),
+        ).order_by()
+    }
+    images = dict(
+        PropertyImage.objects.filter(property__landlord=landlord).values('property_id')
+        .annotate(n=models.Count('id')).order_by().values_list('property_id', 'n')
+    )
+
+    statuses = ('pending', 'accepted', 'rejected')
+    totals = {
+        "properties": len(properties),
+        "available": 0,
+        "applications": dict.fromkeys(statuses, 0),
+        "images": 0,
+    }
+    for prop in properties:
+        counts = applications.get(prop['id'], {})
+        prop['applications'] = {st: counts.get(st, 0) for st in statuses}
+        prop['images'] = images.get(prop['id'], 0)
+        totals['available'] += int(prop['is_available'])
+        totals['images'] += prop['images']
+        for st in statuses:
+            totals['applications'][st] += prop['applications'][st]
+    return {"totals": totals, "properties": properties}
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def landlord_dashboard(request):
+    """
+    Cached per landlord; invalidated by Property/Application/PropertyImage changes.
+    """
+    if request.user.role != 'landlord':
+        return Response({"detail": "Only landlords have a dashboard."}, status=status.HTTP_403_FORBIDDEN)
+    key = dashboard_cache_key(request.user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = landlord_dashboard_data(request.user)
+        cache.set(key, data, settings.LANDLORD_DASHBOARD_CACHE_SECONDS)
+    return Response(data)
 
 
 # ================= Message ViewSet =================
@@ -307,16 +328,93 @@ class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.select_related('sender', 'receiver').all().order_by('-created_at')
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 2}
+
+    def perform_create(self, serializer):
+        # the message and its inbox/badge counter updates commit together
+        with transaction.atomic():
+            serializer.save()
 
     def get_queryset(self):
         user = self.request.user
-        return Message.objects.filter(models.Q(sender=user) | models.Q(receiver=user)).order_by('-created_at')
+        return super().get_queryset().filter(models.Q(sender=user) | models.Q(receiver=user))
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Full-text search over the user's messages: ?q=<text>[&cursor=..][&page_size=..]
+        Results are best match first with <mark>-highlighted snippets.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"q": "This parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        rows, next_cursor = search_messages(request.user, query, request.query_params.get('cursor'), limit)
+        next_url = None
+        if next_cursor:
+            params = request.query_params.copy()
+            params['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        return Response({"next": next_url, "results": rows})
+
+
+# ================= Conversations =================
+class ThreadCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+
+class ConversationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Inbox: one row per counterpart with last message and unread count.
+      GET /api/conversations/
+      GET /api/conversations/<peer_id>/messages/   (cursor paginated, newest first)
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_value_regex = r'\d+'
+    query_budget = {'GET': 3}
+
+    def get_queryset(self):
+        return Conversation.objects.filter(owner=self.request.user)\
+            .select_related('peer', 'last_message').order_by('-last_message_at')
+
+    @action(detail=True, methods=['get'], url_path='messages')
+    def messages(self, request, pk=None):
+        qs = thread_messages(request.user, pk)
+        paginator = ThreadCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        return paginator.get_paginated_response(ThreadMessageSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['post'], url_path='read')
+    def read(self, request, pk=None):
+        """
+        Mark the thread read, optionally only up to message id `up_to`.
+        """
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return Response({"up_to": "Must be a message id."}, status=status.HTTP_400_BAD_REQUEST)
+        marked = mark_thread_read(request.user, int(pk), up_to)
+        if marked:
+            reader = request.user.pk
+            transaction.on_commit(lambda: publish_event([int(pk)], "read", by=reader, up_to=up_to))
+        unread = Conversation.objects.filter(owner=request.user, peer_id=pk).values_list('unread_count', flat=True).first()
+        return Response({"marked": marked, "unread_count": max(unread or 0, 0)})
 
 
 # ================= Custom JWT Login View =================
 # We import serializer from serializers.py; make sure CustomTokenObtainPairSerializer is defined there.
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
 
 
 # ================= AUTH ME ENDPOINT =================
@@ -333,6 +431,8 @@ def auth_me(request):
 
 class BannerListView(ListAPIView):
     serializer_class = BannerSerializer
+    use_read_replica = True
+    query_budget = 2
 
     def get_queryset(self):
         return Banner.objects.filter(is_active=True)
@@ -340,17 +440,19 @@ class BannerListView(ListAPIView):
 
 
 
+@query_budget({'GET': 1})
 @api_view(['GET', 'PATCH', 'PUT'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser, JSONParser])
+@throttle_classes([*APIView.throttle_classes, UploadBucketThrottle])
 def profile_me(request):
     user = request.user
 
-    print("---- profile_me DEBUG ----")
-    print("method:", request.method)
-    print("content_type:", request.content_type)
-    print("FILES keys:", list(request.FILES.keys()))
-    print("DATA keys:", list(request.data.keys()))
+    if request.method != 'GET' and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "profile_me %s content_type=%s files=%s fields=%s",
+            request.method, request.content_type, list(request.FILES), list(request.data),
+        )
 
     if request.method == 'GET':
         return Response(UserSerializer(user, context={'request': request}).data)
@@ -375,7 +477,7 @@ def profile_me(request):
         serializer.save()
         return Response(serializer.data, status=200)
 
-    print("serializer errors:", serializer.errors)
+    logger.info("profile_me rejected for user %s: %s", user.pk, serializer.errors)
     return Response(serializer.errors, status=400)
 
 
@@ -387,6 +489,68 @@ class FacilityListView(generics.ListAPIView):
     queryset = Facility.objects.all().order_by('name')
     serializer_class = FacilitySerializer
     permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+    query_budget = 2
+
+    def list(self, request, *args, **kwargs):
+        # served from the in-memory registry, already sorted by name
+        return Response(self.get_serializer(get_facility_registry().facilities, many=True).data)
+
+
+# ================= Bootstrap (reference data) =================
+def bootstrap_data(request):
+    """
+    Regions with their districts, facilities and active banners: three queries
+    (facilities come from the in-memory registry).
+    """
+    regions = Region.objects.prefetch_related(
+        models.Prefetch('districts', queryset=District.objects.order_by('name').only('id', 'name', 'region_id'))
+    ).order_by('name')
+    return {
+        "regions": [
+            {"id": r.id, "name": r.name, "districts": [{"id": d.id, "name": d.name} for d in r.districts.all()]}
+            for r in regions
+        ],
+        "facilities": FacilitySerializer(get_facility_registry().facilities, many=True).data,
+        "banners": BannerSerializer(Banner.objects.filter(is_active=True), many=True, context={'request': request}).data,
+    }
+
+
+def _render_bootstrap(request, version):
+    body = json.dumps({"version": version, **bootstrap_data(request)}, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return {
+        "etag": f'W/"{hashlib.sha1(body).hexdigest()[:20]}"',
+        "gzip": gzip.compress(body, compresslevel=9),
+    }
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def bootstrap(request):
+    """
+    Everything the app needs on startup in one response, pre-rendered and
+    gzipped once per version of the reference data (see caching.py).
+    """
+    version = get_bootstrap_version()
+    # banner URLs are absolute, so the rendering is per scheme and host
+    key = bootstrap_cache_key(version, f"{request.scheme}://{request.get_host()}")
+    payload = cache.get(key)
+    if payload is None:
+        payload = _render_bootstrap(request, version)
+        cache.set(key, payload, settings.BOOTSTRAP_CACHE_SECONDS)
+
+    if payload["etag"] in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(payload["gzip"], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(payload["gzip"]), content_type='application/json')
+    response['ETag'] = payload["etag"]
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
 
 
 
@@ -424,8 +588,8 @@ class DeleteAccountView(APIView):
         )
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
-        user.delete()
+        # deactivated now; rows and media are removed by a background job
+        request_account_deletion(request.user)
 
         return Response(
             {"detail": "Account deleted successfully."},
@@ -435,6 +599,7 @@ class DeleteAccountView(APIView):
 
 class ForgotPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'otp'
 
     def post(self, request):
         serializer = ForgotPasswordSerializer(data=request.data)
@@ -451,20 +616,21 @@ class ForgotPasswordView(APIView):
 
         code = str(random.randint(100000, 999999))
 
-        PasswordResetOTP.objects.create(user=user, code=code)
-
-        send_mail(
-            subject="Your password reset code",
-            message=f"Your password reset code is: {code}",
-            from_email=None,
-            recipient_list=[email],
-        )
+        # queued, not sent: the SMTP round trip happens in the mail worker
+        with transaction.atomic():
+            PasswordResetOTP.objects.create(user=user, code=code)
+            queue_mail(
+                subject="Your password reset code",
+                message=f"Your password reset code is: {code}",
+                recipient_list=[email],
+            )
 
         return Response({"detail": "OTP sent to email"}, status=status.HTTP_200_OK)
 
 
 class VerifyOTPView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'otp'
 
     def post(self, request):
         serializer = VerifyOTPSerializer(data=request.data)
@@ -473,17 +639,11 @@ class VerifyOTPView(APIView):
         email = serializer.validated_data['email']
         code = serializer.validated_data['code']
 
-        try:
-            user = User.objects.get(email=email)
-            otp = PasswordResetOTP.objects.filter(
-                user=user,
-                code=code,
-                is_used=False
-            ).latest('created_at')
-        except:
+        otp = PasswordResetOTP.lookup(email, code)
+        if otp is None:
             return Response({"detail": "Invalid code"}, status=400)
 
-        if otp.is_expired():
+        if otp.expired:
             return Response({"detail": "Code expired"}, status=400)
 
         return Response({"detail": "Code verified"}, status=200)
@@ -491,6 +651,7 @@ class VerifyOTPView(APIView):
 
 class ResetPasswordView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'otp'
 
     def post(self, request):
         serializer = ResetPasswordSerializer(data=request.data)
@@ -500,24 +661,20 @@ class ResetPasswordView(APIView):
         code = serializer.validated_data['code']
         new_password = serializer.validated_data['new_password']
 
-        try:
-            user = User.objects.get(email=email)
-            otp = PasswordResetOTP.objects.filter(
-                user=user,
-                code=code,
-                is_used=False
-            ).latest('created_at')
-        except:
+        otp = PasswordResetOTP.lookup(email, code)
+        if otp is None:
             return Response({"detail": "Invalid request"}, status=400)
 
-        if otp.is_expired():
+        if otp.expired:
             return Response({"detail": "Code expired"}, status=400)
 
-        user.set_password(new_password)
-        user.save()
-
-        otp.is_used = True
-        otp.save()
+        with transaction.atomic():
+            # expiry and single use are re-checked by the UPDATE itself
+            if not otp.consume():
+                return Response({"detail": "Invalid request"}, status=400)
+            user = otp.user
+            user.set_password(new_password)
+            user.save()
 
         return Response({"detail": "Password reset successful"}, status=200)
 
@@ -530,21 +687,22 @@ from rest_framework.decorators import api_view, permission_classes
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
-from .models import Notification, UserNotification
+from .models import Notification, UserNotification, get_unread_counts, mark_notifications_read
 from .serializers import NotificationSerializer
 
 
 class NotificationListAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    use_read_replica = True
+    query_budget = 2
 
     def get(self, request):
-        notifications = Notification.objects.filter(is_active=True)
+        rows = UserNotification.objects.filter(
+            user=request.user, notification__is_active=True
+        ).select_related('notification').order_by('-created_at')
         data = []
-        for n in notifications:
-            un, _ = UserNotification.objects.get_or_create(
-                user=request.user,
-                notification=n
-            )
+        for un in rows:
+            n = un.notification
             data.append({
                 "id": n.id,
                 "title": n.title,
@@ -555,30 +713,28 @@ class NotificationListAPIView(APIView):
         return Response(data)
 
 
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def badges(request):
+    """
+    Unread notification/message counts for app badges, served from the
+    per-user counter row instead of the full feed.
+    """
+    notifications, messages = get_unread_counts(request.user)
+    return Response({"notifications": notifications, "messages": messages})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, pk):
     notification = get_object_or_404(Notification, pk=pk)
-    un, _ = UserNotification.objects.get_or_create(
-        user=request.user,
-        notification=notification
-    )
-    un.read = True
-    un.read_at = timezone.now()
-    un.save()
+    mark_notifications_read(request.user, notification)
     return Response({"detail": "marked read"})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_all_notifications_read(request):
-    notifications = Notification.objects.filter(is_active=True)
-    for n in notifications:
-        un, _ = UserNotification.objects.get_or_create(
-            user=request.user,
-            notification=n
-        )
-        un.read = True
-        un.read_at = timezone.now()
-        un.save()
+    mark_notifications_read(request.user)
     return Response({"detail": "all marked read"})
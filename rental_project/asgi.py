@@ -2,6 +2,8 @@
 ASGI config for rental_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to EVENTS_PATH are served by the Server-Sent Events stream in
+core.events; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rental_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from core.events import sse_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+        return await sse_app(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -45,11 +45,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # for static in prod
+    'core.instrumentation.RequestMetricsMiddleware',  # Server-Timing, query budgets
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # for CORS
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',  # no-op without DATABASE_REPLICAS
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,13 +75,100 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'rental_project.wsgi.application'
 
-# Database (SQLite for now; you can switch to Postgres in prod)
-DATABASES = {
+# Database: SQLite unless POSTGRES_DB is set (POSTGRES_USER/PASSWORD/HOST/PORT).
+if os.getenv('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            # QuerySet.iterator() streams through server-side cursors; PgBouncer in
+            # transaction mode cannot hold them, so turn them off behind it
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('POSTGRES_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
+            'OPTIONS': {
+                'sslmode': os.getenv('POSTGRES_SSLMODE', 'prefer'),
+                'connect_timeout': int(os.getenv('POSTGRES_CONNECT_TIMEOUT', '5')),
+            },
+        }
+    }
+    if os.getenv('DB_POOL', 'True') == 'True':
+        # psycopg 3 pool, one per worker process (CONN_MAX_AGE must stay 0). Size it
+        # to the threads that hold a connection at once: request threads plus
+        # background tasks. Workers x max_size must fit the server's max_connections.
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', str(int(os.getenv('WEB_THREADS', '4')) + 2))),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        }
+    else:
+        # persistent connection per thread, checked before reuse
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# SQLITE_TUNED=True: settings for many concurrent writers. WAL lets readers
+# run alongside the writer, BEGIN IMMEDIATE takes the write lock up front
+# (a deferred transaction that reads and then writes fails with "database is
+# locked" instead of waiting), and busy_timeout makes writers queue. Run
+# `manage.py sqlite_maintenance --loop` alongside to keep the WAL small.
+SQLITE_TUNED = os.getenv('SQLITE_TUNED', 'False') == 'True'
+SQLITE_TUNED_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',  # durable across app crashes; only an OS crash can drop the last commits
+        f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}",
+        f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))}",
+        'PRAGMA cache_size=-20000',  # KiB, per connection
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+if SQLITE_TUNED and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = SQLITE_TUNED_OPTIONS
+
+# Read replicas (core/db_routers.py): comma-separated database NAMEs, or
+# HOST[:PORT]/NAME for server databases, each a copy of `default` that is
+# kept in sync outside Django. Locally: DATABASE_REPLICAS=replica.sqlite3
+# after `cp db.sqlite3 replica.sqlite3`.
+for i, entry in enumerate(filter(None, (e.strip() for e in os.getenv('DATABASE_REPLICAS', '').split(','))), start=1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if '/' in entry and 'sqlite3' not in replica['ENGINE']:
+        host, replica['NAME'] = entry.split('/', 1)
+        replica['HOST'], _, replica['PORT'] = host.partition(':')
+    else:
+        replica['NAME'] = entry if os.path.isabs(entry) else BASE_DIR / entry
+    DATABASES[f'replica{i}'] = replica
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter'] if len(DATABASES) > 1 else []
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))  # read-your-writes window
+REPLICA_STICKY_COOKIE = 'db_primary_until'
+REPLICA_HEALTH_CHECK_SECONDS = 10
+REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', '30'))
+
+# Cache. The default is per-process; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache, or
+# FileBasedCache on a single host) so invalidation reaches every worker.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+LANDLORD_DASHBOARD_CACHE_SECONDS = int(os.getenv('LANDLORD_DASHBOARD_CACHE_SECONDS', '300'))
+# /api/bootstrap/ is rebuilt on change; this only bounds staleness with a per-process cache
+BOOTSTRAP_CACHE_SECONDS = int(os.getenv('BOOTSTRAP_CACHE_SECONDS', '3600'))
+# facility registry max age (core/facilities.py); bounds staleness without a shared cache
+FACILITY_REGISTRY_TTL = int(os.getenv('FACILITY_REGISTRY_TTL', '30'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -113,10 +202,43 @@ AUTH_USER_MODEL = 'core.User'
 # REST framework + JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
+    ),
+    # token buckets shared by all workers on the host (core/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.AnonBucketThrottle',
+        'core.throttling.UserBucketThrottle',
+        'core.throttling.ScopedBucketThrottle',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON', '120/min'),
+        'user': os.getenv('THROTTLE_USER', '600/min'),
+        'login': os.getenv('THROTTLE_LOGIN', '10/min'),
+        'otp': os.getenv('THROTTLE_OTP', '5/min'),
+        'uploads': os.getenv('THROTTLE_UPLOADS', '30/min'),
+    },
 }
 
+THROTTLE_STORE_PATH = os.getenv('THROTTLE_STORE_PATH', str(BASE_DIR / 'throttle.sqlite3'))
+
+# Per-process cache of JWT-authenticated users (core/authentication.py), checked against
+# a per-user version in CACHES; without a shared CACHES backend other workers see user
+# changes only after this many seconds. 0 disables it.
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '60'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '1024'))
+
+# Reverse geocoding of Property lat/lng (core/geo.py). A GeoJSON FeatureCollection
+# of region and district polygons; without it, regions come from the nearest of the
+# bundled towns (approximate near region borders, no districts); add the polygons later
+# and run `manage.py geocode_properties` to replace those guesses.
+GEO_BOUNDARIES_PATH = os.getenv('GEO_BOUNDARIES_PATH', str(BASE_DIR / 'core' / 'data' / 'tz_boundaries.geojson'))
+GEO_TOWNS_PATH = os.getenv('GEO_TOWNS_PATH', str(BASE_DIR / 'core' / 'data' / 'tz_towns.json'))
+GEO_REGION_PROPERTY = os.getenv('GEO_REGION_PROPERTY', 'region')
+GEO_DISTRICT_PROPERTY = os.getenv('GEO_DISTRICT_PROPERTY', 'district')
+
+# Login writes last_login at most this often per user (seconds)
+LAST_LOGIN_UPDATE_INTERVAL = int(os.getenv('LAST_LOGIN_UPDATE_INTERVAL', '300'))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=12),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
@@ -127,6 +249,16 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Background work (core/tasks.py): run on a thread after commit, or inline
+BACKGROUND_TASKS_INLINE = os.getenv('BACKGROUND_TASKS_INLINE', 'False') == 'True'
+
+# Server-Sent Events (core/events.py, served by the ASGI app only).
+# Set EVENTS_SOCKET_DIR to a directory shared by all workers on the host so
+# events published by one worker reach clients connected to the others.
+EVENTS_PATH = '/api/events/'
+EVENTS_SOCKET_DIR = os.getenv('EVENTS_SOCKET_DIR', '')
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', '25'))
+
 # Email (Zoho)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.zoho.com'
@@ -137,6 +269,50 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f"World Link Security Systems <{EMAIL_HOST_USER}>"
 SERVER_EMAIL = EMAIL_HOST_USER
 
+# Outbound email queue (core/mail.py); run `manage.py send_queued_email --loop`
+# also drain in-process right after queueing (best effort; retries need the worker)
+EMAIL_QUEUE_KICK = os.getenv('EMAIL_QUEUE_KICK', 'True') == 'True'
+EMAIL_QUEUE_BATCH_SIZE = int(os.getenv('EMAIL_QUEUE_BATCH_SIZE', '100'))
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', '5'))
+EMAIL_QUEUE_RETRY_BASE_SECONDS = 30
+EMAIL_QUEUE_RETRY_MAX_SECONDS = 3600
+EMAIL_QUEUE_LEASE_SECONDS = 300
+EMAIL_QUEUE_KEEP_DAYS = int(os.getenv('EMAIL_QUEUE_KEEP_DAYS', '7'))  # sent/failed rows, then `send_queued_email --purge`
+
+# Logging. LOG_LEVEL gates the app's loggers; REQUEST_LOG_LEVEL=INFO logs the
+# timings of every request (core.requests), otherwise only query budget
+# overruns show. LOG_FORMAT=json writes one JSON object per line, extra fields included.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'core.instrumentation.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json' if os.getenv('LOG_FORMAT') == 'json' else 'plain'},
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        'core': {'level': os.getenv('LOG_LEVEL', 'INFO')},
+        'core.requests': {'level': os.getenv('REQUEST_LOG_LEVEL', 'WARNING')},
+    },
+}
+
+# Request instrumentation (core/instrumentation.py)
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+# a view over its query_budget raises instead of logging a warning (core/tests.py turns this on)
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', 'False') == 'True'
+
+# Slow-query log (core/slowqueries.py; read it with `manage.py slowqueries`). 0 turns it off.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+# rotate daily from cron with `manage.py slowqueries --rotate` (or logrotate without copytruncate);
+# past SLOW_QUERY_LOG_MAX_BYTES new samples are dropped until the next rotation
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', str(BASE_DIR / '.cache' / 'slowqueries.jsonl'))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
+SLOW_QUERY_LOG_KEEP = int(os.getenv('SLOW_QUERY_LOG_KEEP', '7'))  # rotated files kept by --rotate
+SLOW_QUERY_EXPLAIN_SECONDS = 300  # EXPLAIN each fingerprint at most this often per process
+
 # Messages
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
@@ -12,6 +12,7 @@ from core.views import (
     PropertyViewSet,
     ApplicationViewSet,
     MessageViewSet,
+    ConversationViewSet,
     RegisterView,
     auth_me,
     RegionListView,
@@ -29,6 +30,9 @@ from core.views import (
     NotificationListAPIView,
     mark_notification_read,
     mark_all_notifications_read,
+    badges,
+    landlord_dashboard,
+    bootstrap,
 )
 
 # --------------------
@@ -38,6 +42,7 @@ router = DefaultRouter()
 router.register(r'properties', PropertyViewSet, basename='property')
 router.register(r'applications', ApplicationViewSet, basename='application')
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'conversations', ConversationViewSet, basename='conversation')
 
 # --------------------
 # URL Patterns
@@ -58,6 +63,12 @@ urlpatterns = [
     # Banners
     path('api/banners/', BannerListView.as_view(), name='banner-list'),
 
+    # Regions + districts + facilities + banners in one cached payload
+    path('api/bootstrap/', bootstrap, name='bootstrap'),
+
+    # Landlord dashboard
+    path('api/landlord/dashboard/', landlord_dashboard, name='landlord-dashboard'),
+
     # Profile
     path('api/profile/me/', profile_me, name='profile-me'),
 
@@ -80,6 +91,7 @@ urlpatterns = [
     path('api/notifications/', NotificationListAPIView.as_view(), name='notifications-list'),
     path('api/notifications/<int:pk>/mark-read/', mark_notification_read, name='notification-mark-read'),
     path('api/notifications/mark-all-read/', mark_all_notifications_read, name='notifications-mark-all-read'),
+    path('api/badges/', badges, name='badges'),
 
     # DRF browsable auth (dev)
     path('api-auth/', include('rest_framework.urls')),